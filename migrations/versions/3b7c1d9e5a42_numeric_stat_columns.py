@@ -0,0 +1,77 @@
+"""numeric shadow columns for catalog stats
+
+Revision ID: 3b7c1d9e5a42
+Revises: e0ad9afedf32
+Create Date: 2026-10-18 10:12:31.482615
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c1d9e5a42'
+down_revision = 'e0ad9afedf32'
+branch_labels = None
+depends_on = None
+
+NUMERIC_FIELDS = {
+    'characters': ['height', 'mass', 'birth_year'],
+    'planets': ['diameter', 'rotation_period', 'orbital_period', 'gravity',
+                'population'],
+    'vehicles': ['cost_in_credits', 'length', 'max_atmosphering_speed', 'crew',
+                 'passengers', 'cargo_capacity'],
+}
+
+# Frozen copy of api.models.parse_stat, the migration must not change with the app
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?(?:e[+-]?\d+)?', re.IGNORECASE)
+
+
+def parse_stat(value):
+    if value is None:
+        return None
+    text = str(value).strip().lower().replace(',', '')
+    match = NUMBER_RE.search(text)
+    if not match:
+        return None
+    number = float(match.group())
+    if text.endswith('aby'):
+        number = -number
+    return number
+
+
+def backfill(table, fields):
+    """Fills the new columns of the existing rows, later writes keep them in sync"""
+    columns = [sa.column('id'), *(sa.column(field) for field in fields),
+               *(sa.column(f'{field}_num') for field in fields)]
+    table_clause = sa.table(table, *columns)
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(table_clause.c.id,
+                                  *(table_clause.c[field] for field in fields))).all()
+    if not rows:
+        return
+    updates = [{'row_id': row.id,
+                **{f'{field}_num': parse_stat(getattr(row, field)) for field in fields}}
+               for row in rows]
+    stmt = (table_clause.update()
+            .where(table_clause.c.id == sa.bindparam('row_id'))
+            .values({f'{field}_num': sa.bindparam(f'{field}_num') for field in fields}))
+    bind.execute(stmt, updates)
+
+
+def upgrade():
+    for table, fields in NUMERIC_FIELDS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.add_column(sa.Column(f'{field}_num', sa.Float(), nullable=True))
+                batch_op.create_index(batch_op.f(f'ix_{table}_{field}_num'), [f'{field}_num'], unique=False)
+        backfill(table, fields)
+
+
+def downgrade():
+    for table, fields in NUMERIC_FIELDS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.drop_index(batch_op.f(f'ix_{table}_{field}_num'))
+                batch_op.drop_column(f'{field}_num')
@@ -0,0 +1,36 @@
+"""indexes for catalog filters
+
+Revision ID: 8f2a6c4d1e07
+Revises: 3b7c1d9e5a42
+Create Date: 2026-10-18 11:40:05.913274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2a6c4d1e07'
+down_revision = '3b7c1d9e5a42'
+branch_labels = None
+depends_on = None
+
+FILTER_FIELDS = {
+    'characters': ['hair_color', 'skin_color', 'eye_color', 'gender'],
+    'planets': ['name', 'climate', 'terrain'],
+    'vehicles': ['model', 'manufacturer', 'vehicle_class'],
+}
+
+
+def upgrade():
+    for table, fields in FILTER_FIELDS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.create_index(batch_op.f(f'ix_{table}_{field}'), [field], unique=False)
+
+
+def downgrade():
+    for table, fields in FILTER_FIELDS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.drop_index(batch_op.f(f'ix_{table}_{field}'))
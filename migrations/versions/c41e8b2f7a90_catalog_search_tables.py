@@ -0,0 +1,41 @@
+"""full text search tables for the catalog
+
+Revision ID: c41e8b2f7a90
+Revises: 8f2a6c4d1e07
+Create Date: 2026-10-18 13:05:47.220381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8b2f7a90'
+down_revision = '8f2a6c4d1e07'
+branch_labels = None
+depends_on = None
+
+ENTITIES = ['people', 'planets', 'vehicles']
+
+
+def upgrade():
+    # Run `flask rebuild-search-index` afterwards to index the existing rows
+    for entity in ENTITIES:
+        if op.get_bind().dialect.name == 'postgresql':
+            op.execute(f"""CREATE TABLE {entity}_search (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                content VARCHAR NOT NULL,
+                document TSVECTOR GENERATED ALWAYS AS (
+                    setweight(to_tsvector('simple', name), 'A') ||
+                    setweight(to_tsvector('simple', content), 'B')) STORED)""")
+            op.execute(f"""CREATE INDEX ix_{entity}_search_document
+                ON {entity}_search USING GIN (document)""")
+        else:
+            op.execute(f"""CREATE VIRTUAL TABLE {entity}_search USING fts5(
+                name, content, tokenize = 'unicode61 remove_diacritics 2')""")
+
+
+def downgrade():
+    for entity in ENTITIES:
+        op.execute(f'DROP TABLE {entity}_search')
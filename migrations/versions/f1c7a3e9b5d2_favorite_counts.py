@@ -0,0 +1,35 @@
+"""favorite counters on the catalog tables
+
+Revision ID: f1c7a3e9b5d2
+Revises: b2f5c8e1d934
+Create Date: 2026-10-18 16:58:09.244671
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7a3e9b5d2'
+down_revision = 'b2f5c8e1d934'
+branch_labels = None
+depends_on = None
+
+CATALOG_TABLES = {'characters': 'people', 'planets': 'planets', 'vehicles': 'vehicles'}
+
+
+def upgrade():
+    for table, entity in CATALOG_TABLES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.create_index(batch_op.f(f'ix_{table}_favorite_count'), ['favorite_count'], unique=False)
+        op.execute(f"""UPDATE {table} SET favorite_count = (
+            SELECT COUNT(*) FROM favorites
+            WHERE favorites.entity_type = '{entity}' AND favorites.entity_id = {table}.id)""")
+
+
+def downgrade():
+    for table in CATALOG_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_favorite_count'))
+            batch_op.drop_column('favorite_count')
@@ -0,0 +1,202 @@
+"""
+In memory typeahead over the catalog names (people, planets and vehicles).
+Names are kept in a sorted list of word suffixes ("luke skywalker" and
+"skywalker") searched with bisect, plus a trigram index used as a fuzzy
+fallback when a prefix finds no name at all. Requests never read the database:
+the index is loaded when the app starts, updated by the catalog handlers after
+their commit and reloaded in the background every AUTOCOMPLETE_MAX_AGE seconds
+so other worker processes pick up changes too.
+"""
+import bisect
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from api.models import db
+from api.utils import APIException
+from api.catalog import CATALOG_MODELS, entity_of
+
+
+AUTOCOMPLETE_MAX_AGE = 300
+FUZZY_MIN_SCORE = 0.5
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_suffixes(text):
+    words = text.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class NameIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reloading = False
+        self.loaded_at = None
+        self.keys = []
+        self.names = {}
+        self.sizes = {}
+        self.grams = defaultdict(set)
+
+    def _add(self, entity, uid, name):
+        """
+        Indexes a name and returns its suffix keys, the caller adds them to
+        `keys` and sorts it once (one insort per key is quadratic on a load).
+        """
+        item = (entity, uid)
+        text = normalize(name)
+        grams = trigrams(text)
+        self.names[item] = name
+        self.sizes[item] = len(grams)
+        for gram in grams:
+            self.grams[gram].add(item)
+        return [(suffix, entity, uid) for suffix in word_suffixes(text)]
+
+    def _remove(self, entity, uid):
+        item = (entity, uid)
+        name = self.names.pop(item, None)
+        if name is None:
+            return
+        del self.sizes[item]
+        text = normalize(name)
+        for suffix in word_suffixes(text):
+            position = bisect.bisect_left(self.keys, (suffix, entity, uid))
+            if position < len(self.keys) and self.keys[position] == (suffix, entity, uid):
+                del self.keys[position]
+        for gram in trigrams(text):
+            self.grams[gram].discard(item)
+
+    def add(self, row):
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            entity = entity_of(row)
+            self._remove(entity, row.id)
+            for key in self._add(entity, row.id, row.name):
+                bisect.insort(self.keys, key)
+
+    def add_many(self, entity, names):
+        """Same as add for (id, name) pairs of one entity"""
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            # Removed first, _remove bisects keys so it needs them sorted
+            for uid, name in names:
+                self._remove(entity, uid)
+            for uid, name in names:
+                self.keys.extend(self._add(entity, uid, name))
+            self.keys.sort()
+
+    def remove(self, row):
+        with self.lock:
+            if self.loaded_at is not None:
+                self._remove(entity_of(row), row.id)
+
+    def load(self):
+        """Reads every catalog name (needs an app context)"""
+        rows = []
+        for entity, model in CATALOG_MODELS.items():
+            for uid, name in db.session.execute(db.select(model.id, model.name)):
+                rows.append((entity, uid, name))
+        fresh = NameIndex()
+        for entity, uid, name in rows:
+            fresh.keys.extend(fresh._add(entity, uid, name))
+        fresh.keys.sort()
+        with self.lock:
+            self.keys, self.names = fresh.keys, fresh.names
+            self.sizes, self.grams = fresh.sizes, fresh.grams
+            self.loaded_at = time.monotonic()
+            self.reloading = False
+
+    def _reload_in_background(self, app):
+        def reload():
+            with app.app_context():
+                try:
+                    self.load()
+                finally:
+                    self.reloading = False
+        threading.Thread(target=reload, daemon=True).start()
+
+    def ensure_loaded(self):
+        if self.loaded_at is None:
+            self.load()
+            return
+        with self.lock:
+            stale = time.monotonic() - self.loaded_at > AUTOCOMPLETE_MAX_AGE
+            if not stale or self.reloading:
+                return
+            self.reloading = True
+        self._reload_in_background(current_app._get_current_object())
+
+    def complete(self, prefix, limit):
+        prefix = normalize(prefix)
+        found = []
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            while position < len(self.keys) and len(found) < limit:
+                key, entity, uid = self.keys[position]
+                if not key.startswith(prefix):
+                    break
+                if (entity, uid) not in found:
+                    found.append((entity, uid))
+                position += 1
+            if not found:
+                found = self.fuzzy(prefix, limit)
+            return [(entity, uid, self.names[(entity, uid)])
+                    for entity, uid in found]
+
+    def fuzzy(self, text, limit):
+        """
+        Names holding most of the trigrams of `text`, closest names first
+        (call it holding the lock).
+        """
+        query = trigrams(text)
+        shared = Counter()
+        for gram in query:
+            shared.update(self.grams.get(gram, ()))
+        scored = []
+        for item, count in shared.items():
+            score = count / len(query)
+            if score >= FUZZY_MIN_SCORE:
+                similarity = count / (len(query) + self.sizes[item] - count)
+                scored.append((-score, -similarity, item))
+        scored.sort()
+        return [item for score, similarity, item in scored[:limit]]
+
+
+name_index = NameIndex()
+
+
+def setup_autocomplete(app):
+    """Loads the index at startup so no request pays for it"""
+    with app.app_context():
+        try:
+            name_index.load()
+        except SQLAlchemyError:
+            # Tables not created yet (first `flask db upgrade`), the first
+            # request loads it instead
+            db.session.rollback()
+            app.logger.warning("Autocomplete index not loaded at startup")
+
+
+def autocomplete(prefix, limit):
+    if not normalize(prefix):
+        raise APIException("Prefix is required", 400)
+    name_index.ensure_loaded()
+    return [{"type": entity,
+             "uid": uid,
+             "name": name,
+             "url": f"/api/{entity}/{uid}"}
+            for entity, uid, name in name_index.complete(prefix, limit)]
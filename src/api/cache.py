@@ -0,0 +1,152 @@
+"""
+In process caches for catalog reads.
+Each worker process has its own copy, writes in another worker are only seen
+once the entry expires, so keep the TTL short enough for that to be acceptable.
+"""
+import gzip
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+from werkzeug.http import quote_etag
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is used without it
+    brotli = None
+
+
+class LRUCache:
+    """Bounded least recently used cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.deletes = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self):
+        """
+        Read it before loading a value and pass it to set: a value read while
+        a write committed is skipped, as its delete may already have run.
+        """
+        with self.lock:
+            return self.deletes
+
+    def set(self, key, value, generation=None):
+        with self.lock:
+            if generation is not None and generation != self.deletes:
+                return
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.deletes += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries),
+                    "maxsize": self.maxsize,
+                    "ttl": self.ttl,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "expirations": self.expirations,
+                    "hit_ratio": self.hits / lookups if lookups else None}
+
+
+# (ETag, serialized row) of catalog rows keyed by (entity, id), a hit answers
+# the request, conditional or not, without reading the database
+detail_cache = LRUCache(maxsize=int(os.getenv("DETAIL_CACHE_SIZE", 4096)),
+                        ttl=float(os.getenv("DETAIL_CACHE_TTL", 300)))
+
+# Encoded list responses keyed by their ETag, which changes with the table
+# version, so old versions are never invalidated, they just age out
+body_cache = LRUCache(maxsize=int(os.getenv("LIST_CACHE_SIZE", 128)),
+                      ttl=float(os.getenv("LIST_CACHE_TTL", 3600)))
+
+ENCODINGS = {"br": lambda body: brotli.compress(body),
+             "gzip": lambda body: gzip.compress(body, compresslevel=6)}
+ETAG_SUFFIXES = {"identity": "", "br": "-br", "gzip": "-gz"}
+
+
+def variant_etags(etag):
+    """Every encoding gets its own strong ETag"""
+    return [etag + suffix for suffix in ETAG_SUFFIXES.values()]
+
+
+def pick_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def variant_headers(etag, encoding):
+    return {"ETag": quote_etag(etag + ETAG_SUFFIXES[encoding]),
+            "Vary": "Accept-Encoding"}
+
+
+def not_modified_response(etag):
+    """304 with the same validator and Vary as the 200 it revalidates"""
+    return "", 304, variant_headers(etag, pick_encoding())
+
+
+def body_response(etag, variants):
+    """
+    Builds the response for the encoding the client accepts, compressing the
+    JSON body the first time that encoding is asked for and keeping it next
+    to the plain one.
+    """
+    encoding = pick_encoding()
+    if encoding not in variants:
+        variants[encoding] = ENCODINGS[encoding](variants["identity"])
+    response = current_app.response_class(variants[encoding],
+                                          mimetype="application/json")
+    response.headers.update(variant_headers(etag, encoding))
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def cached_body(etag):
+    variants = body_cache.get(etag)
+    if variants is None:
+        return None
+    return body_response(etag, variants)
+
+
+def cache_body(etag, response_body):
+    variants = {"identity": current_app.json.dumps(response_body).encode()}
+    body_cache.set(etag, variants)
+    return body_response(etag, variants)
@@ -0,0 +1,280 @@
+"""
+Query helpers shared by the catalog list endpoints (people, planets and vehicles)
+"""
+import hashlib
+from flask import request
+from sqlalchemy.exc import IntegrityError
+from api.models import db, Characters, Planets, Vehicles, TableVersions, parse_stat
+from api.utils import APIException, paginate, MAX_PAGE_SIZE
+from api.cache import variant_etags
+
+
+CATALOG_MODELS = {"people": Characters, "planets": Planets, "vehicles": Vehicles}
+
+MAX_BATCH_SIZE = 5000
+IDS_CHUNK_SIZE = 500
+
+RANGE_OPERATORS = {"gt": "__gt__", "gte": "__ge__",
+                   "lt": "__lt__", "lte": "__le__"}
+
+
+def entity_of(row):
+    """Name of the catalog entity of a row, as used in its url"""
+    for entity, model in CATALOG_MODELS.items():
+        if isinstance(row, model):
+            return entity
+    raise ValueError(f"{row!r} is not a catalog entity")
+
+
+def get_version(entity):
+    version = db.session.execute(db.select(TableVersions.version)
+                                 .where(TableVersions.name == entity)).scalar()
+    return version or 0
+
+
+def bump_version(entity):
+    """Call it in the same transaction as every write to the entity table"""
+    updated = db.session.execute(db.update(TableVersions)
+                                 .where(TableVersions.name == entity)
+                                 .values(version=TableVersions.version + 1))
+    if not updated.rowcount:
+        db.session.add(TableVersions(name=entity, version=1))
+
+
+def catalog_etag(entity, *parts):
+    """
+    Strong ETag of a catalog response: it only changes when the table version
+    does, `parts` tell apart the responses of the same table (id, query...).
+    """
+    raw = ":".join([entity, str(get_version(entity)), *map(str, parts)])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(etag):
+    return any(request.if_none_match.contains(tag) for tag in variant_etags(etag))
+
+
+def get_fields(model):
+    """
+    Reads ?fields=name,gender and returns the list of requested columns,
+    or None when the whole row was asked for.
+    "uid" and "url" are always sent, so they are accepted and skipped.
+    """
+    value = request.args.get("fields")
+    if not value:
+        return None
+    fields = []
+    for field in value.split(","):
+        field = field.strip()
+        if not field or field in ("uid", "id", "url") or field in fields:
+            continue
+        if field not in model.public_fields:
+            raise APIException(f"Unknown field: {field}", 400)
+        fields.append(field)
+    return fields
+
+
+def apply_range_filters(model, stmt):
+    """
+    Adds a WHERE clause for every ?<stat>_gt= / _gte= / _lt= / _lte= arg.
+    They compare against the indexed <stat>_num shadow columns.
+    """
+    for arg, value in request.args.items():
+        field, _, operator = arg.rpartition("_")
+        if operator not in RANGE_OPERATORS:
+            continue
+        if field not in model.numeric_fields:
+            raise APIException(f"Unknown filter: {arg}", 400)
+        try:
+            number = float(value)
+        except ValueError:
+            raise APIException(f"Invalid number for {arg}", 400)
+        column = getattr(model, f"{field}_num")
+        stmt = stmt.where(getattr(column, RANGE_OPERATORS[operator])(number))
+    return stmt
+
+
+def apply_filters(model, stmt):
+    """
+    Adds a WHERE clause for every ?filter[<column>]=<value> arg. Repeating the
+    arg matches any of the values. Only indexed columns can be filtered.
+    """
+    for arg in request.args:
+        if not (arg.startswith("filter[") and arg.endswith("]")):
+            continue
+        field = arg[len("filter["):-1]
+        if field not in model.filter_fields:
+            raise APIException(f"Unknown filter: {arg}", 400)
+        column = getattr(model, field)
+        values = request.args.getlist(arg)
+        if len(values) == 1:
+            stmt = stmt.where(column == values[0])
+        else:
+            stmt = stmt.where(column.in_(values))
+    return apply_range_filters(model, stmt)
+
+
+def get_sort_keys(model):
+    """
+    Reads ?sort=-mass,name into the (column, descending) keys used by
+    paginate. Stats are sorted by their numeric copy and the id always
+    closes the list so the order is stable.
+    """
+    keys = []
+    value = request.args.get("sort")
+    for field in (value.split(",") if value else []):
+        field = field.strip()
+        descending = field.startswith("-")
+        field = field.lstrip("-")
+        if field == "name":
+            column = model.name
+        elif field in model.numeric_fields:
+            column = getattr(model, f"{field}_num")
+        else:
+            raise APIException(f"Unknown sort field: {field}", 400)
+        keys.append((column, descending))
+    keys.append((model.id, False))
+    return keys
+
+
+def get_ids():
+    ids = []
+    for value in request.args.get("ids", "").split(","):
+        value = value.strip()
+        if not value:
+            continue
+        if not value.isdigit():
+            raise APIException(f"Invalid id: {value}", 400)
+        if int(value) not in ids:
+            ids.append(int(value))
+    if not ids:
+        raise APIException("Invalid ids", 400)
+    if len(ids) > MAX_PAGE_SIZE:
+        raise APIException(f"At most {MAX_PAGE_SIZE} ids per request", 400)
+    return ids
+
+
+def get_many(model):
+    """
+    Rows of ?ids=1,5,9 in the order they were asked for, read with
+    WHERE id IN (...) in chunks of IDS_CHUNK_SIZE ids. Unknown ids are
+    listed under "missing".
+    """
+    ids = get_ids()
+    fields = get_fields(model)
+    found = {}
+    for start in range(0, len(ids), IDS_CHUNK_SIZE):
+        chunk = ids[start:start + IDS_CHUNK_SIZE]
+        if fields is None:
+            rows = db.session.execute(db.select(model).where(model.id.in_(chunk))).scalars()
+            found.update((row.id, row.serialize()) for row in rows)
+        else:
+            columns = [getattr(model, field) for field in fields]
+            rows = db.session.execute(db.select(model.id, *columns).where(model.id.in_(chunk)))
+            found.update((row.id, model.serialize_fields(row, fields)) for row in rows)
+    return {"results": [found[uid] for uid in ids if uid in found],
+            "missing": [uid for uid in ids if uid not in found]}
+
+
+def list_catalog(model):
+    """Body of a catalog list response: a page of rows, or the rows of ?ids="""
+    if "ids" in request.args:
+        return get_many(model)
+    fields = get_fields(model)
+    keys = get_sort_keys(model)
+    if fields is None:
+        stmt = apply_filters(model, db.select(model))
+        rows, next_url = paginate(stmt, keys)
+        return {"results": [row.serialize() for row in rows], "next": next_url}
+    # Only the requested columns are read, rows are never turned into models
+    columns = [model.id] + [getattr(model, field) for field in fields]
+    for column, descending in keys:
+        if column.key not in [c.key for c in columns]:
+            columns.append(column)
+    stmt = apply_filters(model, db.select(*columns))
+    rows, next_url = paginate(stmt, keys, scalars=False)
+    return {"results": [model.serialize_fields(row, fields) for row in rows],
+            "next": next_url}
+
+
+def catalog_values(model, data, partial=False):
+    """
+    Column values of a catalog row, numeric shadow columns included, as the
+    model validators are skipped by bulk statements.
+    With `partial` only the fields present in `data` are returned, for the
+    updates that must keep the other stored values.
+    """
+    values = {}
+    for field in model.public_fields:
+        if partial and field not in data:
+            continue
+        value = data.get(field)
+        if value is None and not model.__table__.c[field].nullable:
+            value = "unknown"
+        values[field] = value
+    for field in model.numeric_fields:
+        if field in values:
+            values[f"{field}_num"] = parse_stat(values[field])
+    return values
+
+
+def writable_fields(model, data):
+    """
+    Fields of a PUT body the client may change. favorite_count and the
+    <stat>_num copies are kept by the server and dropped like unknown keys.
+    """
+    if not isinstance(data, dict):
+        raise APIException("A JSON object is required", 400)
+    return {field: value for field, value in data.items()
+            if field in model.public_fields}
+
+
+def validate_item(model, item, taken_names):
+    if not isinstance(item, dict):
+        return ["Item must be an object"]
+    errors = [f"Unknown field: {field}" for field in item
+              if field not in model.public_fields]
+    errors += [f"{field} must be a string" for field, value in item.items()
+               if field in model.public_fields and value is not None
+               and not isinstance(value, str)]
+    errors += [f"{field} is required" for field in model.required_fields
+               if not item.get(field)]
+    name = item.get("name")
+    if model.__table__.c.name.unique and isinstance(name, str) and name:
+        if name in taken_names:
+            errors.append(f"Name already exists: {name}")
+        taken_names.add(name)
+    return errors
+
+
+def create_batch(model, items):
+    """
+    Validates every item first and only then inserts them all with a single
+    multi-row INSERT ... RETURNING. Returns the new rows (the caller commits),
+    or raises with the errors of every invalid item.
+    """
+    if not isinstance(items, list) or not items:
+        raise APIException("A non empty list of items is required", 400)
+    if len(items) > MAX_BATCH_SIZE:
+        raise APIException(f"At most {MAX_BATCH_SIZE} items per batch", 400)
+    taken_names = set()
+    if model.__table__.c.name.unique:
+        names = [item.get("name") for item in items
+                 if isinstance(item, dict) and isinstance(item.get("name"), str)]
+        taken_names = set(db.session.execute(db.select(model.name)
+                                             .where(model.name.in_(names))).scalars())
+    errors = []
+    for index, item in enumerate(items):
+        item_errors = validate_item(model, item, taken_names)
+        if item_errors:
+            errors.append({"index": index, "errors": item_errors})
+    if errors:
+        raise APIException("Invalid items", 400, payload={"results": errors})
+    values = [catalog_values(model, item) for item in items]
+    stmt = db.insert(model).returning(model, sort_by_parameter_order=True)
+    try:
+        return db.session.execute(stmt, values).scalars().all()
+    except IntegrityError:
+        # A concurrent batch took one of the names after the SELECT above
+        db.session.rollback()
+        raise APIException("Name already exists", 409)
@@ -1,6 +1,14 @@
 
+import time
 import click
-from api.models import db, Users
+from api.models import db, Users, parse_stat
+from api.search import rebuild_search_index
+from api.catalog import CATALOG_MODELS, bump_version
+from api.facets import rebuild_facets
+from api.importer import import_catalog
+from api.favorites import backfill_favorites, reconcile_favorite_counts
+from api.recommend import build_recommendations
+from api.export import EXPORT_MODELS, PARQUET_TABLES, export_parquet_files
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -33,3 +41,92 @@ def setup_commands(app):
     @app.cli.command("insert-test-data")
     def insert_test_data():
         pass
+
+    @app.cli.command("sync-numeric-stats")
+    def sync_numeric_stats():
+        """Recomputes the <stat>_num columns from the string stats of every catalog row"""
+        for entity, model in CATALOG_MODELS.items():
+            columns = [getattr(model, field) for field in model.numeric_fields]
+            rows = db.session.execute(db.select(model.id, *columns)).all()
+            updates = []
+            for row in rows:
+                values = {"id": row.id}
+                for field in model.numeric_fields:
+                    values[f"{field}_num"] = parse_stat(getattr(row, field))
+                updates.append(values)
+            if updates:
+                db.session.execute(db.update(model), updates)
+                # Sorted and filtered lists change, their ETags must too
+                bump_version(entity)
+            db.session.commit()
+            print(f"{model.__tablename__}: {len(updates)} rows updated")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search():
+        """Creates the full text search tables if needed and refills them from the catalog"""
+        rebuild_search_index()
+        print("Search index rebuilt")
+
+    @app.cli.command("rebuild-facets")
+    def rebuild_facets_command():
+        """Recomputes the facet counts of every catalog entity with GROUP BY"""
+        rebuild_facets()
+        # /facets bodies and their ETags depend on the table versions
+        for entity in CATALOG_MODELS:
+            bump_version(entity)
+        db.session.commit()
+        print("Facet counts rebuilt")
+
+    @app.cli.command("import-catalog")
+    @click.argument("file")
+    @click.option("--entity", type=click.Choice(["people", "planets", "vehicles"]),
+                  help="Entity of every record, by default it is read from the record url")
+    @click.option("--batch-size", default=1000, show_default=True)
+    def import_catalog_command(file, entity, batch_size):
+        """Imports a SWAPI JSON / NDJSON dump, rows with a known name are updated"""
+        started = time.perf_counter()
+        totals = import_catalog(file, entity=entity, batch_size=batch_size)
+        rebuild_search_index()
+        rebuild_facets()
+        elapsed = time.perf_counter() - started
+        for name, total in totals.items():
+            print(f"{name}: {total['inserted']} inserted, {total['updated']} updated")
+        rows = sum(total["inserted"] + total["updated"] for total in totals.values())
+        print(f"Done in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+
+    @app.cli.command("backfill-favorites")
+    def backfill_favorites_command():
+        """Copies the rows of character/planet/vehicle_favorites into the favorites table"""
+        for entity, inserted in backfill_favorites().items():
+            print(f"{entity}: {inserted} favorites copied")
+        reconcile_favorite_counts()
+
+    @app.cli.command("reconcile-favorite-counts")
+    def reconcile_favorite_counts_command():
+        """Recomputes the favorite_count of every catalog row from the favorites table"""
+        for entity, fixed in reconcile_favorite_counts().items():
+            print(f"{entity}: {fixed} counters fixed")
+
+    @app.cli.command("build-recommendations")
+    def build_recommendations_command():
+        """Recomputes the related favorites of every catalog row (needs numpy and scipy)"""
+        try:
+            rows = build_recommendations()
+        except RuntimeError as error:
+            raise click.ClickException(str(error))
+        print(f"{rows} related items written")
+
+    @app.cli.command("export-parquet")
+    @click.option("--out", required=True, help="Directory of the .parquet files")
+    @click.option("--table", "tables", multiple=True, type=click.Choice(list(EXPORT_MODELS)),
+                  help="Table to export, can be repeated. By default the user and social tables")
+    @click.option("--numeric-stats", is_flag=True,
+                  help="Also write the parsed numeric copies of the catalog stats")
+    @click.option("--batch-size", default=10000, show_default=True,
+                  help="Rows read per query batch and written per row group")
+    def export_parquet_command(out, tables, numeric_stats, batch_size):
+        """Writes tables to Parquet files (needs pyarrow)"""
+        try:
+            export_parquet_files(out, tables or PARQUET_TABLES, numeric_stats, batch_size)
+        except RuntimeError as error:
+            raise click.ClickException(str(error))
@@ -0,0 +1,138 @@
+"""
+Full table dumps for the analytics jobs.
+GET /export/<table>.ndjson streams one JSON object per line: rows are read in
+id order through a server side cursor (yield_per), so memory does not grow
+with the table. A dump that broke can be resumed with ?after_id=<last id>.
+`flask export-parquet` writes the same tables as Parquet files, one row group
+per batch, when pyarrow is installed.
+"""
+import os
+import zlib
+import sqlalchemy as sa
+from flask import current_app, request, stream_with_context
+from api.models import (db, Users, Posts, Comments, Medias, Followers,
+                        Characters, CharacterFavorites, Planets, PlanetFavorites,
+                        Vehicles, VehicleFavorites, Favorites)
+from api.utils import APIException
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional, only export-parquet needs it
+    pyarrow = None
+
+EXPORT_MODELS = {"people": Characters,
+                 "planets": Planets,
+                 "vehicles": Vehicles,
+                 "users": Users,
+                 "posts": Posts,
+                 "comments": Comments,
+                 "medias": Medias,
+                 "followers": Followers,
+                 "character_favorites": CharacterFavorites,
+                 "planet_favorites": PlanetFavorites,
+                 "vehicle_favorites": VehicleFavorites,
+                 "favorites": Favorites}
+
+EXPORT_BATCH_SIZE = 1000
+
+PARQUET_TABLES = ("users", "posts", "comments", "followers", "favorites")
+
+# Columns never written to a dump
+PRIVATE_COLUMNS = {"users": ("password",)}
+
+
+def get_after_id():
+    value = request.args.get("after_id", "0")
+    if not value.isdigit():
+        raise APIException("Invalid after_id", 400)
+    return int(value)
+
+
+def ndjson_chunks(model, after_id):
+    """One chunk of NDJSON lines per batch of EXPORT_BATCH_SIZE rows"""
+    stmt = (db.select(model).where(model.id > after_id).order_by(model.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE))
+    dumps = current_app.json.dumps
+    for rows in db.session.execute(stmt).scalars().partitions():
+        # The session only keeps weak references, sent rows are freed
+        yield "".join(dumps(row.serialize()) + "\n" for row in rows).encode()
+
+
+def gzip_chunks(chunks):
+    """Compresses a stream, flushing after every chunk so rows reach the client"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_response(table):
+    model = EXPORT_MODELS.get(table)
+    if model is None:
+        raise APIException(f"Unknown table: {table}", 404)
+    chunks = ndjson_chunks(model, get_after_id())
+    gzipped = bool(request.accept_encodings["gzip"])
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+    response = current_app.response_class(stream_with_context(chunks),
+                                          mimetype="application/x-ndjson")
+    response.vary.add("Accept-Encoding")
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def arrow_type(column):
+    if isinstance(column.type, sa.Boolean):
+        return pyarrow.bool_()
+    if isinstance(column.type, sa.Integer):
+        return pyarrow.int64()
+    if isinstance(column.type, sa.Float):
+        return pyarrow.float64()
+    if isinstance(column.type, sa.DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+def parquet_columns(table, numeric_stats):
+    """
+    Columns of a table dump. The catalog tables keep their string stats, the
+    parsed <stat>_num copies are only added with `numeric_stats`.
+    """
+    model = EXPORT_MODELS[table]
+    skipped = set(PRIVATE_COLUMNS.get(table, ()))
+    if not numeric_stats:
+        skipped.update(f"{field}_num" for field in getattr(model, "numeric_fields", ()))
+    return [column for column in model.__table__.columns
+            if column.key not in skipped]
+
+
+def export_parquet(table, path, numeric_stats=False, batch_size=EXPORT_BATCH_SIZE):
+    """Writes a table to a Parquet file, returns the number of rows written"""
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required to export Parquet files, "
+                           "install it with `pipenv install pyarrow`")
+    columns = parquet_columns(table, numeric_stats)
+    schema = pyarrow.schema([pyarrow.field(column.key, arrow_type(column),
+                                           nullable=column.nullable)
+                             for column in columns])
+    stmt = (sa.select(*columns).order_by(columns[0].table.c.id)
+            .execution_options(yield_per=batch_size))
+    total = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for rows in db.session.execute(stmt).partitions():
+            batch = pyarrow.RecordBatch.from_pylist([row._asdict() for row in rows],
+                                                    schema=schema)
+            writer.write_batch(batch)
+            total += len(rows)
+    return total
+
+
+def export_parquet_files(out_dir, tables=PARQUET_TABLES, numeric_stats=False,
+                         batch_size=EXPORT_BATCH_SIZE, report=print):
+    os.makedirs(out_dir, exist_ok=True)
+    for table in tables:
+        path = os.path.join(out_dir, f"{table}.parquet")
+        total = export_parquet(table, path, numeric_stats, batch_size)
+        report(f"{table}: {total} rows written to {path}")
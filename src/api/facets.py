@@ -0,0 +1,96 @@
+"""
+Counts of the catalog rows by facet (gender, climate, vehicle_class...).
+They live in the facet_counts table and are kept up to date by the catalog
+handlers in the same transaction as the row change, so GET /facets never
+groups the catalog tables. `flask rebuild-facets` recomputes them from scratch.
+"""
+from collections import Counter
+from api.models import db, FacetCounts
+from api.utils import APIException, upsert_insert
+from api.catalog import CATALOG_MODELS, entity_of
+
+# Facet value of the rows where the column is NULL
+MISSING_VALUE = "unknown"
+
+
+def facet_values(row):
+    """Facet values of a catalog row, read them before changing the row"""
+    values = {field: getattr(row, field) for field in row.facet_fields}
+    return {field: MISSING_VALUE if value is None else value
+            for field, value in values.items()}
+
+
+def add_count(entity, field, value, delta):
+    """
+    Single statement upsert, two writes bringing the same new value can't
+    both try to INSERT it.
+    """
+    if delta < 0:
+        # The row of a value being removed always exists
+        db.session.execute(db.update(FacetCounts)
+                           .where(FacetCounts.entity == entity,
+                                  FacetCounts.field == field,
+                                  FacetCounts.value == value)
+                           .values(count=FacetCounts.count + delta))
+        return
+    stmt = upsert_insert(FacetCounts).values(entity=entity, field=field,
+                                             value=value, count=delta)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[FacetCounts.entity, FacetCounts.field, FacetCounts.value],
+        set_={"count": FacetCounts.count + delta}))
+
+
+def update_facets(entity, removed=(), added=()):
+    """
+    Applies the facet values of the rows that left (`removed`) and joined
+    (`added`) the table, one UPDATE per value that actually changed.
+    """
+    deltas = Counter()
+    for values in removed:
+        for field, value in values.items():
+            deltas[(field, value)] -= 1
+    for values in added:
+        for field, value in values.items():
+            deltas[(field, value)] += 1
+    for (field, value), delta in deltas.items():
+        if delta:
+            add_count(entity, field, value, delta)
+
+
+def count_row(row):
+    update_facets(entity_of(row), added=[facet_values(row)])
+
+
+def uncount_row(row):
+    update_facets(entity_of(row), removed=[facet_values(row)])
+
+
+def rebuild_facets(entities=None):
+    for entity in entities or CATALOG_MODELS:
+        model = CATALOG_MODELS[entity]
+        db.session.execute(db.delete(FacetCounts).where(FacetCounts.entity == entity))
+        for field in model.facet_fields:
+            value = db.func.coalesce(getattr(model, field), MISSING_VALUE)
+            rows = db.session.execute(db.select(value, db.func.count())
+                                      .group_by(value)).all()
+            db.session.add_all(FacetCounts(entity=entity, field=field,
+                                           value=value, count=count)
+                               for value, count in rows)
+    db.session.commit()
+
+
+def get_facets(entity):
+    """Values of every facet of an entity, most common first"""
+    model = CATALOG_MODELS.get(entity)
+    if model is None:
+        raise APIException(f"Unknown entity: {entity}", 404)
+    rows = db.session.execute(db.select(FacetCounts)
+                              .where(FacetCounts.entity == entity,
+                                     FacetCounts.count > 0)
+                              .order_by(FacetCounts.count.desc(),
+                                        FacetCounts.value)).scalars()
+    results = {field: [] for field in model.facet_fields}
+    for row in rows:
+        if row.field in results:
+            results[row.field].append(row.serialize())
+    return results
@@ -0,0 +1,233 @@
+"""
+Favorites of a user over the catalog (people, planets and vehicles).
+They are stored in the favorites table keyed by (user_id, entity_type,
+entity_id). The per entity tables (character_favorites...) are only read by
+`flask backfill-favorites`, which copies the rows written before the move.
+"""
+import sqlalchemy as sa
+from api.utils import APIException, insert_ignore
+from api.models import (db, Favorites, Characters, CharacterFavorites, Planets,
+                        PlanetFavorites, Vehicles, VehicleFavorites)
+
+# Catalog model of every entity type and the favorites column of the old tables
+FAVORITE_MODELS = {"people": (Characters, "character_id"),
+                   "planets": (Planets, "planet_id"),
+                   "vehicles": (Vehicles, "vehicle_id")}
+
+MAX_SYNC_SIZE = 5000
+
+NOT_FOUND_MESSAGES = {"people": "Person not found",
+                      "planets": "Planet not found",
+                      "vehicles": "Vehicle not found"}
+
+LEGACY_FAVORITES = {"people": CharacterFavorites,
+                    "planets": PlanetFavorites,
+                    "vehicles": VehicleFavorites}
+
+
+def favorite_result(favorite):
+    """Serialized favorite, with the id key the /favorite/<entity> routes used to send"""
+    model, key = FAVORITE_MODELS[favorite.entity_type]
+    return {**favorite.serialize(), key: favorite.entity_id}
+
+
+def count_favorite(entity, entity_id, delta):
+    """Moves the favorite_count of a catalog row, in the transaction of the favorite change"""
+    model = FAVORITE_MODELS[entity][0]
+    db.session.execute(db.update(model).where(model.id == entity_id)
+                       .values(favorite_count=model.favorite_count + delta),
+                       execution_options={"synchronize_session": False})
+
+
+def count_favorites(pairs, delta):
+    """count_favorite for many (entity, id) pairs, one executemany UPDATE per entity"""
+    for entity, (model, key) in FAVORITE_MODELS.items():
+        ids = [{"row_id": entity_id} for pair_entity, entity_id in pairs if pair_entity == entity]
+        if ids:
+            table = model.__table__
+            db.session.execute(sa.update(table)
+                               .where(table.c.id == sa.bindparam("row_id"))
+                               .values(favorite_count=table.c.favorite_count + delta), ids)
+
+
+def add_favorite(user_id, entity, entity_id):
+    """
+    Returns the new favorite, or None when it already was a favorite.
+    A single INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: the
+    SELECT only finds the catalog row when it exists (entity_id has no
+    foreign key) and the unique index keeps concurrent requests from adding
+    it twice. The caller commits.
+    """
+    model = FAVORITE_MODELS[entity][0]
+    entity_type = sa.cast(sa.literal(entity), Favorites.entity_type.type)
+    row = sa.select(sa.literal(user_id), entity_type, model.id).where(model.id == entity_id)
+    stmt = (insert_ignore(Favorites)
+            .from_select(["user_id", "entity_type", "entity_id"], row)
+            .returning(Favorites))
+    favorite = db.session.execute(stmt).scalar()
+    if favorite:
+        count_favorite(entity, entity_id, 1)
+        return favorite
+    if db.session.execute(sa.select(model.id).where(model.id == entity_id)).scalar() is None:
+        raise APIException(NOT_FOUND_MESSAGES[entity], 404)
+    return None
+
+
+def remove_favorite(user_id, entity, entity_id):
+    """Returns the id of the removed favorite, or None. The caller commits"""
+    stmt = (db.delete(Favorites)
+            .where(Favorites.user_id == user_id,
+                   Favorites.entity_type == entity,
+                   Favorites.entity_id == entity_id)
+            .returning(Favorites.id))
+    favorite_id = db.session.execute(stmt).scalar()
+    if favorite_id:
+        count_favorite(entity, entity_id, -1)
+    return favorite_id
+
+
+def remove_entity_favorites(entity, entity_id):
+    """Call it when a catalog row is deleted, entity_id is not a foreign key"""
+    db.session.execute(db.delete(Favorites).where(Favorites.entity_type == entity,
+                                                  Favorites.entity_id == entity_id))
+
+
+def read_pairs(data, name):
+    """(entity, id) pairs of a {"people": [1, 2], "planets": [...]} object"""
+    if not isinstance(data, dict):
+        raise APIException(f"{name} must be an object", 400)
+    pairs = set()
+    for entity, ids in data.items():
+        if entity not in FAVORITE_MODELS:
+            raise APIException(f"Unknown entity: {entity}", 400)
+        if not isinstance(ids, list) or not all(type(uid) is int for uid in ids):
+            raise APIException(f"{entity} must be a list of ids", 400)
+        pairs.update((entity, uid) for uid in ids)
+    if len(pairs) > MAX_SYNC_SIZE:
+        raise APIException(f"At most {MAX_SYNC_SIZE} favorites per request", 400)
+    return pairs
+
+
+def check_exist(pairs):
+    """Raises with the ids that are not in the catalog, one query per entity"""
+    for entity, (model, key) in FAVORITE_MODELS.items():
+        ids = {uid for pair_entity, uid in pairs if pair_entity == entity}
+        if not ids:
+            continue
+        found = set(db.session.execute(db.select(model.id).where(model.id.in_(ids))).scalars())
+        missing = sorted(ids - found)
+        if missing:
+            raise APIException(f"Unknown {entity} ids", 400, payload={"missing": missing})
+
+
+def sync_favorites(user_id, data):
+    """
+    Brings the favorites of a user to the state asked for, either the full
+    set {"people": [1, 2], ...} (entities left out are not touched) or a
+    delta {"add": {...}, "remove": {...}}. The difference with the stored
+    rows is applied with one bulk INSERT and one bulk DELETE. Returns the
+    (entity, id) pairs that changed, the caller commits.
+    """
+    if not isinstance(data, dict):
+        raise APIException("Favorites must be an object", 400)
+    current = set(db.session.execute(db.select(Favorites.entity_type, Favorites.entity_id)
+                                     .where(Favorites.user_id == user_id)).tuples())
+    if "add" in data or "remove" in data:
+        unwanted = read_pairs(data.get("remove", {}), "remove")
+        added = read_pairs(data.get("add", {}), "add") - unwanted - current
+        removed = unwanted & current
+    else:
+        wanted = read_pairs(data, "Favorites")
+        added = wanted - current
+        removed = {(entity, uid) for entity, uid in current
+                   if entity in data and (entity, uid) not in wanted}
+    check_exist(added)
+    inserted = deleted = []
+    if added:
+        # Rows added meanwhile by another request are skipped and not counted
+        inserted = db.session.execute(insert_ignore(Favorites)
+                                      .returning(Favorites.entity_type, Favorites.entity_id),
+                                      [{"user_id": user_id, "entity_type": entity, "entity_id": uid}
+                                       for entity, uid in sorted(added)]).tuples().all()
+        count_favorites(inserted, 1)
+    if removed:
+        deleted = db.session.execute(db.delete(Favorites)
+                                     .where(Favorites.user_id == user_id,
+                                            sa.tuple_(Favorites.entity_type,
+                                                      Favorites.entity_id).in_(sorted(removed)))
+                                     .returning(Favorites.entity_type, Favorites.entity_id)).tuples().all()
+        count_favorites(deleted, -1)
+    return inserted + deleted
+
+
+def list_favorites(user_id):
+    """
+    Favorites of a user grouped by entity, read with a single UNION ALL:
+    every part is a range scan of ix_favorites_user_entity joined to its
+    catalog table.
+    """
+    selects = []
+    for entity, (model, key) in FAVORITE_MODELS.items():
+        selects.append(sa.select(Favorites.entity_type, Favorites.id.label("favorite_id"),
+                                 model.id, model.name)
+                       .join(model, Favorites.entity_id == model.id)
+                       .where(Favorites.user_id == user_id,
+                              Favorites.entity_type == entity))
+    favorites = sa.union_all(*selects).subquery()
+    rows = db.session.execute(sa.select(favorites).order_by(favorites.c.entity_type,
+                                                             favorites.c.favorite_id))
+    results = {entity: [] for entity in FAVORITE_MODELS}
+    for row in rows:
+        results[row.entity_type].append({"uid": row.id,
+                                         "name": row.name,
+                                         "url": f"/api/{row.entity_type}/{row.id}"})
+    return results
+
+
+def backfill_favorites():
+    """Copies the rows of the old favorites tables that are missing, returns the count per entity"""
+    totals = {}
+    for entity, legacy in LEGACY_FAVORITES.items():
+        entity_id = getattr(legacy, FAVORITE_MODELS[entity][1])
+        missing = (sa.select(legacy.user_id, sa.literal(entity), entity_id)
+                   .distinct()
+                   .where(~sa.exists().where(Favorites.user_id == legacy.user_id,
+                                             Favorites.entity_type == entity,
+                                             Favorites.entity_id == entity_id)))
+        inserted = db.session.execute(sa.insert(Favorites).from_select(
+            ["user_id", "entity_type", "entity_id"], missing))
+        totals[entity] = inserted.rowcount
+    db.session.commit()
+    return totals
+
+
+def reconcile_favorite_counts():
+    """Recomputes every favorite_count from the favorites table, returns the rows fixed per entity"""
+    totals = {}
+    for entity, (model, key) in FAVORITE_MODELS.items():
+        count = (sa.select(sa.func.count())
+                 .where(Favorites.entity_type == entity,
+                        Favorites.entity_id == model.id)
+                 .scalar_subquery())
+        updated = db.session.execute(db.update(model)
+                                     .where(model.favorite_count != count)
+                                     .values(favorite_count=count),
+                                     execution_options={"synchronize_session": False})
+        totals[entity] = updated.rowcount
+    db.session.commit()
+    return totals
+
+
+def leaderboard(entity, limit):
+    """Most favorited rows of an entity, read from the favorite_count index"""
+    if entity not in FAVORITE_MODELS:
+        raise APIException(f"Unknown entity: {entity}", 404)
+    model = FAVORITE_MODELS[entity][0]
+    rows = db.session.execute(db.select(model.id, model.name, model.favorite_count)
+                              .where(model.favorite_count > 0)
+                              .order_by(model.favorite_count.desc(), model.id)
+                              .limit(limit))
+    return [{"uid": row.id,
+             "name": row.name,
+             "url": f"/api/{entity}/{row.id}",
+             "favorite_count": row.favorite_count} for row in rows]
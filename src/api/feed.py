@@ -0,0 +1,94 @@
+"""
+Home timeline: the posts of the accounts a user follows, newest first.
+New posts are copied to the timelines table of every follower by a
+background task (fan-out on write), so reading a feed is a range scan of
+ix_timelines_user_date. Accounts with more than FAN_OUT_MAX_FOLLOWERS
+followers are not copied, their posts are read from the posts table when the
+feed is read, together with the posts whose fan-out has not run yet.
+"""
+import os
+import sqlalchemy as sa
+from api.models import db, Posts, Followers, Timelines
+from api.utils import insert_ignore, paginate
+from api.tasks import run_in_background
+from api.posts import SUMMARY_OPTIONS
+
+FAN_OUT_MAX_FOLLOWERS = int(os.getenv("FAN_OUT_MAX_FOLLOWERS", 5000))
+
+# Posts of a newly followed account copied to the timeline of the follower
+FOLLOW_BACKFILL = 100
+
+
+def fan_out_post(post_id):
+    post = db.session.get(Posts, post_id)
+    if post is None:
+        return
+    followers = sa.select(Followers.follower_id, sa.literal(post.id), sa.literal(post.date, sa.DateTime))
+    # The post may be deleted while this runs, SQLite would keep the entries
+    exists = sa.exists().where(Posts.id == post.id)
+    db.session.execute(insert_ignore(Timelines).from_select(
+        ["user_id", "post_id", "date"],
+        followers.where(Followers.following_id == post.user_id, exists)))
+    post.fanned_out = True
+    db.session.commit()
+
+
+def publish_post(post):
+    """Call it after committing a new post"""
+    followers = db.session.execute(sa.select(sa.func.count())
+                                   .where(Followers.following_id == post.user_id)).scalar()
+    if followers <= FAN_OUT_MAX_FOLLOWERS:
+        run_in_background(fan_out_post, post.id)
+
+
+def add_followed_posts(follower_id, following_id):
+    """Copies the latest posts of a newly followed account, in the follow transaction"""
+    latest = (sa.select(sa.literal(follower_id), Posts.id, Posts.date)
+              .where(Posts.user_id == following_id, Posts.fanned_out == sa.true())
+              .order_by(Posts.date.desc(), Posts.id.desc())
+              .limit(FOLLOW_BACKFILL))
+    db.session.execute(insert_ignore(Timelines).from_select(["user_id", "post_id", "date"], latest))
+
+
+def remove_followed_posts(follower_id, following_id):
+    """Removes the posts of an unfollowed account, in the unfollow transaction"""
+    posts = sa.select(Posts.id).where(Posts.user_id == following_id)
+    db.session.execute(sa.delete(Timelines).where(Timelines.user_id == follower_id,
+                                                  Timelines.post_id.in_(posts)))
+
+
+def move_post_entries(post_id, date):
+    """Call it when the date of a post changes, the feed is sorted by the copied date"""
+    db.session.execute(sa.update(Timelines).where(Timelines.post_id == post_id)
+                       .values(date=date))
+
+
+def remove_post_entries(post_id):
+    """
+    Call it when a post is deleted. The ON DELETE CASCADE of timelines is not
+    enforced by SQLite, orphan entries would make feed pages come up short.
+    """
+    db.session.execute(sa.delete(Timelines).where(Timelines.post_id == post_id))
+
+
+def remove_user_entries(user_id):
+    """Same as remove_post_entries for a deleted user: their timeline and their posts"""
+    posts = sa.select(Posts.id).where(Posts.user_id == user_id)
+    db.session.execute(sa.delete(Timelines).where(sa.or_(Timelines.user_id == user_id,
+                                                         Timelines.post_id.in_(posts))))
+
+
+def get_feed(user_id):
+    """A page of the feed, keyset paginated by (date, id) descending"""
+    copied = (sa.select(Timelines.post_id.label("id"), Timelines.date)
+              .where(Timelines.user_id == user_id))
+    pending = (sa.select(Posts.id, Posts.date)
+               .join(Followers, Followers.following_id == Posts.user_id)
+               .where(Followers.follower_id == user_id, Posts.fanned_out == sa.false()))
+    entries = sa.union_all(copied, pending).subquery()
+    keys = [(entries.c.date, True), (entries.c.id, True)]
+    rows, next_url = paginate(sa.select(entries), keys, scalars=False)
+    ids = [row.id for row in rows]
+    posts = {post.id: post for post in db.session.execute(
+        sa.select(Posts).options(*SUMMARY_OPTIONS).where(Posts.id.in_(ids))).scalars()}
+    return [posts[post_id].serialize_summary() for post_id in ids if post_id in posts], next_url
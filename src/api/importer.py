@@ -0,0 +1,211 @@
+"""
+Bulk import of SWAPI dumps into the catalog (see `flask import-catalog`).
+Records are streamed from the file and written in batches: one SELECT to find
+the names already stored, executemany UPDATEs for those (grouped by the fields
+their records hold) and one INSERT for the new ones (COPY on Postgres), then a
+single commit per batch.
+"""
+import io
+import json
+import re
+import time
+from api.models import db
+from api.catalog import CATALOG_MODELS, bump_version, catalog_values
+
+WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+
+class JSONStream:
+    """Consecutive JSON values of a file, decoded while it is read by chunks"""
+
+    def __init__(self, file, chunk_size=1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+
+    def read(self):
+        chunk = self.file.read(self.chunk_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def peek(self):
+        """Next non blank character, "" at the end of the file"""
+        while True:
+            self.position = WHITESPACE_RE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read():
+                return ""
+
+    def skip(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in the JSON document")
+        self.position += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.read():
+                    raise ValueError("Unexpected end of the JSON document")
+                continue
+            # A number cut by the end of the chunk decodes too, read on to be sure
+            if end == len(self.buffer) and self.read():
+                continue
+            self.position = end
+            return value
+
+
+def iter_json_array(stream):
+    """Yields the items of a JSON array one by one"""
+    stream.skip("[")
+    if stream.peek() == "]":
+        stream.skip("]")
+        return
+    while True:
+        yield stream.value()
+        if stream.peek() != ",":
+            stream.skip("]")
+            return
+        stream.skip(",")
+
+
+def iter_object(stream):
+    """
+    Yields the records of a SWAPI page ({"results": [...]}), streaming its
+    results, or the object itself when it is a record.
+    """
+    stream.skip("{")
+    document = {}
+    is_page = False
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.skip(":")
+        if key == "results" and stream.peek() == "[":
+            is_page = True
+            yield from iter_json_array(stream)
+        else:
+            document[key] = stream.value()
+        if stream.peek() == ",":
+            stream.skip(",")
+    stream.skip("}")
+    if not is_page:
+        yield document
+
+
+def read_records(path):
+    """
+    Reads a JSON array, SWAPI pages ({"results": [...]}) or NDJSON (one
+    record or page per line), without loading the whole file.
+    """
+    with open(path, encoding="utf-8") as file:
+        stream = JSONStream(file)
+        if stream.peek() == "[":
+            yield from iter_json_array(stream)
+            return
+        while stream.peek():
+            yield from iter_object(stream)
+
+
+def entity_from_url(url):
+    for entity in CATALOG_MODELS:
+        if f"/{entity}/" in (url or ""):
+            return entity
+    return None
+
+
+def csv_field(value):
+    """
+    COPY (FORMAT csv) reads an unquoted empty field as NULL and a quoted one
+    as an empty string, so None is left empty and strings are always quoted.
+    csv.QUOTE_NONNUMERIC can't be used, it writes None as "".
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def copy_buffer(columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(csv_field(row[column]) for column in columns) + "\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(model, rows):
+    """INSERT through COPY ... FROM STDIN, only available with psycopg2"""
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    columns = list(rows[0].keys())
+    cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(columns)}) "
+                       "FROM STDIN WITH (FORMAT csv)", copy_buffer(columns, rows))
+
+
+def upsert_batch(model, batch):
+    """
+    Writes a batch of records, matching existing rows by name. Existing rows
+    only get the fields present in their record, a partial record does not
+    wipe the others.
+    """
+    by_name = {data["name"]: data for data in batch}
+    existing = dict(db.session.execute(db.select(model.name, model.id)
+                                       .where(model.name.in_(list(by_name)))).all())
+    updates = [{"id": existing[name], **catalog_values(model, data, partial=True)}
+               for name, data in by_name.items() if name in existing]
+    inserts = [catalog_values(model, data) for name, data in by_name.items()
+               if name not in existing]
+    if updates:
+        db.session.execute(db.update(model), updates)
+    if inserts:
+        if db.session.get_bind().dialect.driver == "psycopg2":
+            copy_rows(model, inserts)
+        else:
+            db.session.execute(db.insert(model), inserts)
+    db.session.commit()
+    return len(inserts), len(updates)
+
+
+def import_catalog(path, entity=None, batch_size=1000, report=print):
+    """Returns the count of inserted and updated rows of every entity"""
+    batches = {name: [] for name in CATALOG_MODELS}
+    totals = {name: {"inserted": 0, "updated": 0} for name in CATALOG_MODELS}
+    started = time.perf_counter()
+    done = 0
+
+    def flush(name):
+        nonlocal done
+        inserted, updated = upsert_batch(CATALOG_MODELS[name], batches[name])
+        totals[name]["inserted"] += inserted
+        totals[name]["updated"] += updated
+        done += len(batches[name])
+        batches[name] = []
+        rate = done / (time.perf_counter() - started)
+        report(f"{done} rows imported ({rate:.0f} rows/s)")
+
+    for record in read_records(path):
+        data = record.get("properties", record)
+        name = entity or entity_from_url(data.get("url"))
+        if name is None:
+            raise ValueError(f"Can't tell the entity of {data.get('name')!r}, use --entity")
+        if not data.get("name"):
+            continue
+        model = CATALOG_MODELS[name]
+        batches[name].append({field: data[field] for field in model.public_fields
+                              if field in data})
+        if len(batches[name]) >= batch_size:
+            flush(name)
+    for name in CATALOG_MODELS:
+        if batches[name]:
+            flush(name)
+    for name, total in totals.items():
+        if total["inserted"] or total["updated"]:
+            bump_version(name)
+    db.session.commit()
+    return totals
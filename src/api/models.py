@@ -1,8 +1,31 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
 db = SQLAlchemy()
 
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?(?:e[+-]?\d+)?", re.IGNORECASE)
+
+
+def parse_stat(value):
+    """
+    Turns a SWAPI stat string into a float: "1,000" -> 1000.0,
+    "19BBY" -> 19.0, "22ABY" -> -22.0 (birth years are counted BBY),
+    "1 standard" -> 1.0, "30-165" -> 30.0 and "unknown" / "n/a" -> None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().lower().replace(",", "")
+    match = NUMBER_RE.search(text)
+    if not match:
+        return None
+    number = float(match.group())
+    if text.endswith("aby"):
+        number = -number
+    return number
+
 
 class Users(db.Model):
     id = db.Column(  db.Integer, primary_key=True)
@@ -34,6 +57,19 @@ class Posts(db.Model):
     user_id = db.Column(  db.Integer, db.ForeignKey("users.id"))
     user_to = db.relationship(  "Users", foreign_keys=[user_id],
                                 backref=db.backref("posts_to", lazy="select"))
+    # False until the post is copied to the timelines of the followers,
+    # posts of accounts with too many followers are never copied
+    fanned_out = db.Column(  db.Boolean(), unique=False, nullable=False,
+                             default=False, server_default=db.false())
+    # Kept up to date by the comment handlers
+    comment_count = db.Column(  db.Integer, unique=False, nullable=False,
+                                default=0, server_default="0")
+
+    __table_args__ = (db.Index("ix_posts_date", "date", "id"),
+                      db.Index("ix_posts_user_date", "user_id", "date", "id"),
+                      db.Index("ix_posts_pending_fan_out", "user_id", "date", "id",
+                               postgresql_where=db.text("fanned_out = false"),
+                               sqlite_where=db.text("fanned_out = false")),)
 
     def __repr__(self):
         return f'<Post: {self.id} -> {self.title}>'
@@ -45,10 +81,24 @@ class Posts(db.Model):
                 "body": self.body,
                 "date": self.date,
                 "image_url": self.image_url,
-                "user_id": self.user_id}
+                "user_id": self.user_id,
+                "comment_count": self.comment_count}
+
+    def serialize_summary(self):
+        """serialize() without the body, for lists that load posts with the body deferred"""
+        return {"id": self.id,
+                "title": self.title,
+                "description": self.description,
+                "date": self.date,
+                "image_url": self.image_url,
+                "user_id": self.user_id,
+                "comment_count": self.comment_count}
 
 
 class Comments(db.Model):
+    # Threads are read by post_id in id order
+    __table_args__ = (db.Index("ix_comments_post_id", "post_id", "id"),
+                      db.Index("ix_comments_user_id", "user_id"))
     id = db.Column(  db.Integer, primary_key=True)
     body = db.Column(  db.String(), unique=True, nullable=False)
     user_id = db.Column(  db.Integer, db.ForeignKey("users.id"),
@@ -92,6 +142,9 @@ class Medias(db.Model):
 
 
 class Followers(db.Model):
+    __table_args__ = (db.UniqueConstraint("follower_id", "following_id",
+                                          name="uq_followers_follower_following"),
+                      db.Index("ix_followers_following_id", "following_id"))
     id = db.Column(  db.Integer, primary_key=True)
     following_id = db.Column(  db.Integer, db.ForeignKey("users.id"),
                                unique=False, nullable=False)
@@ -116,11 +169,35 @@ class Characters(db.Model):
     name = db.Column(  db.String(120), unique=True, nullable=False)
     height = db.Column(  db.String(120), unique=False, nullable=True)
     mass = db.Column(  db.String(120), unique=False, nullable=True)
-    hair_color = db.Column(  db.String(120), unique=False, nullable=True)
-    skin_color = db.Column(  db.String(120), unique=False, nullable=True)
-    eye_color = db.Column(  db.String(120), unique=False, nullable=True)
+    hair_color = db.Column(  db.String(120), unique=False, nullable=True, index=True)
+    skin_color = db.Column(  db.String(120), unique=False, nullable=True, index=True)
+    eye_color = db.Column(  db.String(120), unique=False, nullable=True, index=True)
     birth_year = db.Column(  db.String(120), unique=False, nullable=True)
-    gender = db.Column(  db.String(120), unique=False, nullable=True)
+    gender = db.Column(  db.String(120), unique=False, nullable=True, index=True)
+
+    # Parsed copies of the string stats, used for range filters
+    height_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    mass_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    birth_year_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    # Kept up to date by the favorite handlers, see api.favorites
+    favorite_count = db.Column(  db.Integer, unique=False, nullable=False,
+                                 default=0, server_default="0", index=True)
+
+    public_fields = ("name", "height", "mass", "hair_color", "skin_color",
+                     "eye_color", "birth_year", "gender")
+
+    required_fields = ("name",)
+
+    filter_fields = ("name", "gender", "eye_color", "hair_color", "skin_color")
+
+    facet_fields = ("gender", "eye_color")
+
+    numeric_fields = ("height", "mass", "birth_year")
+
+    @db.validates("height", "mass", "birth_year")
+    def validate_numeric(self, key, value):
+        setattr(self, f"{key}_num", parse_stat(value))
+        return value
 
     def __repr__(self):
         return f'<Character {self.name}>'
@@ -137,6 +214,14 @@ class Characters(db.Model):
                 "gender": self.gender,
                 "url": f"/api/people/{self.id}"}
 
+    @staticmethod
+    def serialize_fields(row, fields):
+        result = {"uid": row.id}
+        for field in fields:
+            result[field] = getattr(row, field)
+        result["url"] = f"/api/people/{row.id}"
+        return result
+
 
 class CharacterFavorites(db.Model):
     id = db.Column(  db.Integer, primary_key=True)
@@ -161,14 +246,42 @@ class CharacterFavorites(db.Model):
 
 class Planets(db.Model):
     id = db.Column(  db.Integer, primary_key=True)
-    name = db.Column(  db.String(), unique=False, nullable=False)
+    name = db.Column(  db.String(), unique=False, nullable=False, index=True)
     diameter = db.Column(  db.String(), unique=False, nullable=False)
     rotation_period = db.Column(  db.String(), unique=False, nullable=False)
     orbital_period = db.Column(  db.String(), unique=False, nullable=False)
     gravity = db.Column(  db.String(), unique=False, nullable=False)
     population = db.Column(  db.String(), unique=False, nullable=False)
-    climate = db.Column(  db.String(), unique=False, nullable=False)
-    terrain = db.Column(  db.String(), unique=False, nullable=False)
+    climate = db.Column(  db.String(), unique=False, nullable=False, index=True)
+    terrain = db.Column(  db.String(), unique=False, nullable=False, index=True)
+
+    # Parsed copies of the string stats, used for range filters
+    diameter_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    rotation_period_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    orbital_period_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    gravity_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    population_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    # Kept up to date by the favorite handlers, see api.favorites
+    favorite_count = db.Column(  db.Integer, unique=False, nullable=False,
+                                 default=0, server_default="0", index=True)
+
+    public_fields = ("name", "diameter", "rotation_period", "orbital_period",
+                     "gravity", "population", "climate", "terrain")
+
+    required_fields = public_fields
+
+    filter_fields = ("name", "climate", "terrain")
+
+    facet_fields = ("climate", "terrain")
+
+    numeric_fields = ("diameter", "rotation_period", "orbital_period",
+                      "gravity", "population")
+
+    @db.validates("diameter", "rotation_period", "orbital_period", "gravity",
+                  "population")
+    def validate_numeric(self, key, value):
+        setattr(self, f"{key}_num", parse_stat(value))
+        return value
 
     def __repr__(self):
         return f'<Planet {self.id}: {self.name}>'
@@ -185,6 +298,14 @@ class Planets(db.Model):
                 "terrain": self.terrain,
                 "url": f"/api/planets/{self.id}"}
 
+    @staticmethod
+    def serialize_fields(row, fields):
+        result = {"uid": row.id}
+        for field in fields:
+            result[field] = getattr(row, field)
+        result["url"] = f"/api/planets/{row.id}"
+        return result
+
 
 class PlanetFavorites(db.Model):
     id = db.Column(  db.Integer, primary_key=True)
@@ -210,8 +331,8 @@ class PlanetFavorites(db.Model):
 class Vehicles(db.Model):
     id = db.Column(  db.Integer, primary_key=True)
     name = db.Column(  db.String(120), unique=True, nullable=False)
-    model = db.Column(  db.String(120), unique=False, nullable=True)
-    manufacturer = db.Column(  db.String(120), unique=False, nullable=True)
+    model = db.Column(  db.String(120), unique=False, nullable=True, index=True)
+    manufacturer = db.Column(  db.String(120), unique=False, nullable=True, index=True)
     cost_in_credits = db.Column(  db.String(120), unique=False, nullable=True)
     length = db.Column(  db.String(120), unique=False, nullable=True)
     max_atmosphering_speed = db.Column(  db.String(120), unique=False, nullable=True)
@@ -219,7 +340,37 @@ class Vehicles(db.Model):
     passengers = db.Column(  db.String(120), unique=False, nullable=True)
     cargo_capacity = db.Column(  db.String(120), unique=False, nullable=True)
     consumables = db.Column(  db.String(120), unique=False, nullable=True)
-    vehicle_class = db.Column(  db.String(120), unique=False, nullable=True)
+    vehicle_class = db.Column(  db.String(120), unique=False, nullable=True, index=True)
+
+    # Parsed copies of the string stats, used for range filters
+    cost_in_credits_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    length_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    max_atmosphering_speed_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    crew_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    passengers_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    cargo_capacity_num = db.Column(  db.Float, unique=False, nullable=True, index=True)
+    # Kept up to date by the favorite handlers, see api.favorites
+    favorite_count = db.Column(  db.Integer, unique=False, nullable=False,
+                                 default=0, server_default="0", index=True)
+
+    public_fields = ("name", "model", "manufacturer", "cost_in_credits",
+                     "length", "max_atmosphering_speed", "crew", "passengers",
+                     "cargo_capacity", "consumables", "vehicle_class")
+
+    required_fields = ("name", "model", "manufacturer", "vehicle_class")
+
+    filter_fields = ("name", "model", "manufacturer", "vehicle_class")
+
+    facet_fields = ("vehicle_class", "manufacturer")
+
+    numeric_fields = ("cost_in_credits", "length", "max_atmosphering_speed",
+                      "crew", "passengers", "cargo_capacity")
+
+    @db.validates("cost_in_credits", "length", "max_atmosphering_speed",
+                  "crew", "passengers", "cargo_capacity")
+    def validate_numeric(self, key, value):
+        setattr(self, f"{key}_num", parse_stat(value))
+        return value
 
     def __repr__(self):
         return f'<Vehicle {self.id}: {self.name}>'
@@ -240,6 +391,14 @@ class Vehicles(db.Model):
                 "consumables": self.consumables,
                 "url": f"/api/vehicles/{self.id}"}
 
+    @staticmethod
+    def serialize_fields(row, fields):
+        result = {"uid": row.id, "id": row.id}
+        for field in fields:
+            result[field] = getattr(row, field)
+        result["url"] = f"/api/vehicles/{row.id}"
+        return result
+
 
 class VehicleFavorites(db.Model):
     id = db.Column(  db.Integer, primary_key=True)
@@ -260,3 +419,90 @@ class VehicleFavorites(db.Model):
         return {"id": self.id,
                 "user_id": self.user_id,
                 "vehicle_id": self.vehicle_id}
+
+
+class Favorites(db.Model):
+    # The unique index covers "favorites of a user" reads, the second one
+    # finds the favorites of a catalog row
+    __table_args__ = (db.Index("ix_favorites_user_entity", "user_id", "entity_type",
+                               "entity_id", unique=True),
+                      db.Index("ix_favorites_entity", "entity_type", "entity_id"))
+    id = db.Column(  db.Integer, primary_key=True)
+    user_id = db.Column(  db.Integer, db.ForeignKey("users.id"),
+                          unique=False, nullable=False)
+    entity_type = db.Column(  db.Enum("people", "planets", "vehicles",
+                                      name="favorite_entity_type"),
+                              nullable=False)
+    entity_id = db.Column(  db.Integer, unique=False, nullable=False)
+    user_to = db.relationship(  "Users", foreign_keys=[user_id],
+                                backref=db.backref("favorites_to", lazy="select"))
+
+    def __repr__(self):
+        return (f'<User {self.user_id} has {self.entity_type} '
+                f'{self.entity_id} as favorite>')
+
+    def serialize(self):
+        return {"id": self.id,
+                "user_id": self.user_id,
+                "entity_type": self.entity_type,
+                "entity_id": self.entity_id}
+
+
+class RelatedItems(db.Model):
+    # Precomputed "users who favorited this also favorited" neighbours,
+    # the index finds the rows pointing to a deleted catalog row
+    __table_args__ = (db.Index("ix_related_items_related", "related_type", "related_id"),)
+    entity_type = db.Column(  db.String(20), primary_key=True)
+    entity_id = db.Column(  db.Integer, primary_key=True)
+    related_type = db.Column(  db.String(20), primary_key=True)
+    related_id = db.Column(  db.Integer, primary_key=True)
+    score = db.Column(  db.Float, unique=False, nullable=False)
+
+    def __repr__(self):
+        return (f'<{self.entity_type} {self.entity_id} is related to '
+                f'{self.related_type} {self.related_id}: {self.score}>')
+
+    def serialize(self):
+        return {"type": self.related_type,
+                "uid": self.related_id,
+                "url": f"/api/{self.related_type}/{self.related_id}",
+                "score": self.score}
+
+
+class Timelines(db.Model):
+    # Home timeline entries written by the post fan-out, see api.feed
+    __table_args__ = (db.Index("ix_timelines_user_date", "user_id", "date", "post_id"),)
+    user_id = db.Column(  db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"),
+                          primary_key=True)
+    post_id = db.Column(  db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"),
+                          primary_key=True)
+    date = db.Column(  db.DateTime, unique=False, nullable=False)
+
+    def __repr__(self):
+        return f'<Post {self.post_id} in the timeline of {self.user_id}>'
+
+
+class TableVersions(db.Model):
+    name = db.Column(  db.String(40), primary_key=True)
+    version = db.Column(  db.Integer, unique=False, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<Table {self.name} at version {self.version}>'
+
+    def serialize(self):
+        return {"name": self.name,
+                "version": self.version}
+
+
+class FacetCounts(db.Model):
+    entity = db.Column(  db.String(40), primary_key=True)
+    field = db.Column(  db.String(40), primary_key=True)
+    value = db.Column(  db.String(), primary_key=True)
+    count = db.Column(  db.Integer, unique=False, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<Facet {self.entity}.{self.field}={self.value}: {self.count}>'
+
+    def serialize(self):
+        return {"value": self.value,
+                "count": self.count}
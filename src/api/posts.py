@@ -0,0 +1,131 @@
+"""
+Query helpers of the post endpoints.
+"""
+from datetime import datetime, timezone
+from flask import request, url_for
+from werkzeug.http import parse_date
+from sqlalchemy.orm import defer, joinedload, selectinload
+from api.models import db, Posts, Comments
+from api.utils import APIException, paginate, encode_cursor
+
+# Lists never read the body of the posts
+SUMMARY_OPTIONS = (defer(Posts.body),)
+
+POST_INCLUDES = ("author", "media", "comments")
+
+# Comments embedded in a post detail, the rest are read from the thread
+COMMENTS_PREVIEW = 10
+
+# Columns a PUT may change, user_id, fanned_out and comment_count are kept
+# by the server
+POST_WRITABLE_FIELDS = ("title", "description", "body", "date", "image_url")
+
+
+def list_posts(user_id=None):
+    """
+    A page of posts, newest first, keyset paginated by (date, id) with the
+    ?before= cursor. Served by ix_posts_date, or by ix_posts_user_date for
+    the posts of one user.
+    """
+    stmt = db.select(Posts).options(*SUMMARY_OPTIONS)
+    if user_id is not None:
+        if not user_id.isdigit():
+            raise APIException("Invalid user_id", 400)
+        stmt = stmt.where(Posts.user_id == int(user_id))
+    keys = [(Posts.date, True), (Posts.id, True)]
+    rows, next_url = paginate(stmt, keys, cursor_arg="before")
+    return [row.serialize_summary() for row in rows], next_url
+
+
+def parse_post_date(value):
+    """Accepts the HTTP dates posts are sent with and ISO 8601, stored as naive UTC"""
+    date = None
+    if isinstance(value, str):
+        date = parse_date(value)
+        if date is None:
+            try:
+                date = datetime.fromisoformat(value)
+            except ValueError:
+                date = None
+    if date is None:
+        raise APIException("Invalid date", 400)
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def update_post(post, data):
+    """Applies a PUT body to a post, returns True when its date changed"""
+    if not isinstance(data, dict):
+        raise APIException("A JSON object is required", 400)
+    date = post.date
+    for key, value in data.items():
+        if key not in POST_WRITABLE_FIELDS:
+            continue
+        if key == "date":
+            value = parse_post_date(value)
+        setattr(post, key, value)
+    return post.date != date
+
+
+def count_comment(post_id, delta):
+    """Moves the comment_count of a post, in the transaction of the comment change"""
+    db.session.execute(db.update(Posts).where(Posts.id == post_id)
+                       .values(comment_count=Posts.comment_count + delta),
+                       execution_options={"synchronize_session": False})
+
+
+def list_comments(post_id):
+    """A page of the comments of a post, oldest first, served by ix_comments_post_id"""
+    if db.session.execute(db.select(Posts.id).where(Posts.id == post_id)).scalar() is None:
+        raise APIException("Post not found", 404)
+    stmt = db.select(Comments).where(Comments.post_id == post_id)
+    rows, next_url = paginate(stmt, [(Comments.id, False)])
+    return [row.serialize() for row in rows], next_url
+
+
+def get_includes():
+    """Reads ?include=author,media,comments"""
+    includes = []
+    for include in request.args.get("include", "").split(","):
+        include = include.strip()
+        if not include:
+            continue
+        if include not in POST_INCLUDES:
+            raise APIException(f"Unknown include: {include}", 400)
+        includes.append(include)
+    return includes
+
+
+def get_post(post_id):
+    """
+    A post with the related rows asked for in ?include=, in at most three
+    queries: the author is joined to the post, the media are read with
+    one SELECT ... IN and the first comments with one more.
+    """
+    includes = get_includes()
+    options = []
+    if "author" in includes:
+        options.append(joinedload(Posts.user_to))
+    if "media" in includes:
+        options.append(selectinload(Posts.media_to))
+    row = db.session.execute(db.select(Posts).options(*options)
+                             .where(Posts.id == post_id)).unique().scalar()
+    if not row:
+        raise APIException("Post not found", 404)
+    results = row.serialize()
+    if "author" in includes:
+        results["author"] = row.user_to.serialize() if row.user_to else None
+    if "media" in includes:
+        results["media"] = [media.serialize() for media in row.media_to]
+    if "comments" in includes:
+        comments = db.session.execute(db.select(Comments)
+                                      .where(Comments.post_id == post_id)
+                                      .order_by(Comments.id)
+                                      .limit(COMMENTS_PREVIEW + 1)).scalars().all()
+        results["comments"] = [comment.serialize() for comment in comments[:COMMENTS_PREVIEW]]
+        results["comments_next"] = None
+        if len(comments) > COMMENTS_PREVIEW:
+            cursor = encode_cursor(comments[COMMENTS_PREVIEW - 1].id)
+            results["comments_next"] = url_for("api.post_comments", post_id=post_id, after=cursor)
+    return results
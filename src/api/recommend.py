@@ -0,0 +1,144 @@
+"""
+Item to item recommendations: "users who favorited this also favorited".
+Neighbours are scored with the cosine similarity of the users that favorited
+two items, co_favorites / sqrt(favorites_a * favorites_b), and the best
+RELATED_TOP_K of every item are kept in the related_items table.
+`flask build-recommendations` computes all of them at once with sparse
+matrices (needs numpy and scipy). Between builds, every favorite change
+refreshes the changed item and the other favorites of that user in the
+background, with SQL only.
+"""
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+from api.models import db, Favorites, RelatedItems
+from api.utils import APIException
+from api.favorites import FAVORITE_MODELS
+from api.tasks import run_in_background
+
+try:
+    import numpy
+    import scipy.sparse
+except ImportError:  # numpy and scipy are optional, only the full build needs them
+    numpy = None
+
+RELATED_TOP_K = 20
+
+
+def build_recommendations():
+    """Recomputes the whole related_items table, returns the number of rows written"""
+    if numpy is None:
+        raise RuntimeError("numpy and scipy are required to build recommendations, "
+                           "install them with `pipenv install numpy scipy`")
+    rows = db.session.execute(sa.select(Favorites.user_id, Favorites.entity_type,
+                                        Favorites.entity_id)).all()
+    db.session.execute(sa.delete(RelatedItems))
+    if not rows:
+        db.session.commit()
+        return 0
+    users = {user_id: index for index, user_id in enumerate({row[0] for row in rows})}
+    items = sorted({(row[1], row[2]) for row in rows})
+    positions = {item: index for index, item in enumerate(items)}
+    user_index = numpy.fromiter((users[row[0]] for row in rows), dtype=numpy.int64, count=len(rows))
+    item_index = numpy.fromiter((positions[(row[1], row[2])] for row in rows),
+                                dtype=numpy.int64, count=len(rows))
+    matrix = scipy.sparse.csr_matrix((numpy.ones(len(rows)), (user_index, item_index)),
+                                     shape=(len(users), len(items)))
+    co_favorites = (matrix.T @ matrix).tocsr()
+    co_favorites.setdiag(0)
+    co_favorites.eliminate_zeros()
+    inverse_norms = 1 / numpy.sqrt(numpy.asarray(matrix.sum(axis=0)).ravel())
+    scores = scipy.sparse.diags(inverse_norms) @ co_favorites @ scipy.sparse.diags(inverse_norms)
+    scores = scores.tocsr()
+    related = []
+    for row in range(len(items)):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        if start == end:
+            continue
+        row_scores = scores.data[start:end]
+        row_items = scores.indices[start:end]
+        best = numpy.argsort(-row_scores, kind="stable")[:RELATED_TOP_K]
+        entity, entity_id = items[row]
+        related.extend({"entity_type": entity, "entity_id": entity_id,
+                        "related_type": items[column][0], "related_id": items[column][1],
+                        "score": float(score)}
+                       for column, score in zip(row_items[best], row_scores[best]))
+    if related:
+        db.session.execute(sa.insert(RelatedItems), related)
+    db.session.commit()
+    return len(related)
+
+
+def neighbours(entity, entity_id):
+    """Best RELATED_TOP_K neighbours of one item, computed in SQL"""
+    other = aliased(Favorites)
+    co_favorites = db.session.execute(
+        sa.select(other.entity_type, other.entity_id, sa.func.count())
+        .select_from(Favorites)
+        .join(other, other.user_id == Favorites.user_id)
+        .where(Favorites.entity_type == entity, Favorites.entity_id == entity_id,
+               sa.not_(sa.and_(other.entity_type == entity, other.entity_id == entity_id)))
+        .group_by(other.entity_type, other.entity_id)).all()
+    if not co_favorites:
+        return []
+    candidates = [(row[0], row[1]) for row in co_favorites] + [(entity, entity_id)]
+    degrees = dict(((row[0], row[1]), row[2]) for row in db.session.execute(
+        sa.select(Favorites.entity_type, Favorites.entity_id, sa.func.count())
+        .where(sa.tuple_(Favorites.entity_type, Favorites.entity_id).in_(candidates))
+        .group_by(Favorites.entity_type, Favorites.entity_id)))
+    own_degree = degrees[(entity, entity_id)]
+    scored = sorted(((-count / (own_degree * degrees[(other_type, other_id)]) ** 0.5,
+                      other_type, other_id)
+                     for other_type, other_id, count in co_favorites))
+    return [{"entity_type": entity, "entity_id": entity_id,
+             "related_type": other_type, "related_id": other_id, "score": -score}
+            for score, other_type, other_id in scored[:RELATED_TOP_K]]
+
+
+def refresh_related(user_id, changed):
+    """
+    Recomputes the neighbours of the changed (entity, id) items and of the
+    other favorites of the user, whose co-favorites with them just moved.
+    """
+    items = set(changed)
+    items.update(db.session.execute(sa.select(Favorites.entity_type, Favorites.entity_id)
+                                    .where(Favorites.user_id == user_id)).tuples())
+    for entity, entity_id in sorted(items):
+        db.session.execute(sa.delete(RelatedItems)
+                           .where(RelatedItems.entity_type == entity,
+                                  RelatedItems.entity_id == entity_id))
+        rows = neighbours(entity, entity_id)
+        if rows:
+            db.session.execute(sa.insert(RelatedItems), rows)
+    db.session.commit()
+
+
+def refresh_related_later(user_id, changed):
+    """Call it after committing a favorite change"""
+    if changed:
+        return run_in_background(refresh_related, user_id, list(changed))
+
+
+def remove_related(entity, entity_id):
+    """Call it when a catalog row is deleted"""
+    db.session.execute(sa.delete(RelatedItems).where(
+        sa.or_(sa.and_(RelatedItems.entity_type == entity, RelatedItems.entity_id == entity_id),
+               sa.and_(RelatedItems.related_type == entity, RelatedItems.related_id == entity_id))))
+
+
+def get_related(entity, entity_id, limit):
+    if entity not in FAVORITE_MODELS:
+        raise APIException(f"Unknown entity: {entity}", 404)
+    rows = db.session.execute(sa.select(RelatedItems)
+                              .where(RelatedItems.entity_type == entity,
+                                     RelatedItems.entity_id == entity_id)
+                              .order_by(RelatedItems.score.desc(), RelatedItems.related_type,
+                                        RelatedItems.related_id)
+                              .limit(limit)).scalars().all()
+    names = {}
+    for related_type, (model, key) in FAVORITE_MODELS.items():
+        ids = [row.related_id for row in rows if row.related_type == related_type]
+        if ids:
+            names.update(((related_type, uid), name) for uid, name in db.session.execute(
+                sa.select(model.id, model.name).where(model.id.in_(ids))))
+    return [{**row.serialize(), "name": names.get((row.related_type, row.related_id))}
+            for row in rows]
@@ -1,7 +1,20 @@
 from flask import Flask, request, jsonify, url_for, Blueprint
-from api.models import db, Users, Posts, Comments, Medias, Followers, Characters, CharacterFavorites, Planets, PlanetFavorites, Vehicles, VehicleFavorites
-from api.utils import generate_sitemap, APIException
+from api.models import db, Users, Posts, Comments, Followers, Characters, Planets, Vehicles
+from api.utils import generate_sitemap, APIException, get_page_size, insert_ignore
+from api.catalog import (list_catalog, bump_version, catalog_etag, not_modified, create_batch,
+                         writable_fields)
+from api.search import index_document, index_new_documents, remove_document, search
+from api.autocomplete import autocomplete, name_index
+from api.export import export_response
+from api.favorites import list_favorites, add_favorite, remove_favorite, remove_entity_favorites, favorite_result, count_favorite, leaderboard, sync_favorites
+from api.recommend import get_related, refresh_related_later, remove_related
+from api.posts import list_posts, list_comments, count_comment, get_post, update_post
+from api.feed import (publish_post, add_followed_posts, remove_followed_posts, get_feed,
+                      move_post_entries, remove_post_entries, remove_user_entries)
+from api.facets import facet_values, update_facets, count_row, uncount_row, get_facets
+from api.cache import detail_cache, body_cache, cached_body, cache_body, not_modified_response
 from flask_cors import CORS
+from werkzeug.http import quote_etag
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, get_jwt
 
 api = Blueprint('api', __name__)
@@ -101,9 +114,11 @@ def user(user_id):
         row = db.session.execute(db.select(Users).where(Users.id == user_id)).scalar()
         if not row:
             raise APIException("User not found", 404)
+        remove_user_entries(user_id)
         for post in row.posts_to:
             db.session.delete(post)
         for comment in row.coments_to:
+            count_comment(comment.post_id, -1)
             db.session.delete(comment)
         for follower in row.followers_to:
             db.session.delete(follower)
@@ -115,57 +130,29 @@ def user(user_id):
             db.session.delete(fav)
         for fav in row.vehicle_favorites_to:
             db.session.delete(fav)
+        changed = [(fav.entity_type, fav.entity_id) for fav in row.favorites_to]
+        for fav in row.favorites_to:
+            count_favorite(fav.entity_type, fav.entity_id, -1)
+            db.session.delete(fav)
         db.session.delete(row)
         db.session.commit()
+        refresh_related_later(user_id, changed)
         response_body['results'] = None
         response_body['message'] = 'Usuario eliminado'
         return response_body, 200
 
-@api.route('/users/favorites', methods=['GET'])
+@api.route('/users/favorites', methods=['GET', 'PUT'])
 @jwt_required()
 def user_favorites():
     response_body = {}
-    current_user_record = db.session.execute(db.select(Users).where(Users.id == current_user_id)).scalar()
-    if not current_user_record:
-        response_body['results'] = {"people": [], "planets": [], "vehicles": []}
-        response_body['message'] = 'Favoritos del usuario'
+    if request.method == 'PUT':
+        changed = sync_favorites(current_user_id, request.json)
+        db.session.commit()
+        refresh_related_later(current_user_id, changed)
+        response_body['results'] = list_favorites(current_user_id)
+        response_body['message'] = 'Favoritos actualizados'
         return response_body, 200
-    character_favorites_list = db.session.execute(db.select(CharacterFavorites).where(CharacterFavorites.user_id == current_user_id)).scalars().all()
-    planet_favorites_list = db.session.execute(db.select(PlanetFavorites).where(PlanetFavorites.user_id == current_user_id)).scalars().all()
-    vehicle_favorites_list = db.session.execute(db.select(VehicleFavorites).where(VehicleFavorites.user_id == current_user_id)).scalars().all()
-    favorite_characters_data = []
-    for character_favorite in character_favorites_list:
-        character_record = db.session.execute(db.select(Characters).where(Characters.id == character_favorite.character_id)).scalar()
-        if character_record:
-            favorite_characters_data.append({
-                "uid": character_record.id,
-                "name": character_record.name,
-                "url": f"/api/people/{character_record.id}"
-            })
-    favorite_planets_data = []
-    for planet_favorite in planet_favorites_list:
-        planet_record = db.session.execute(db.select(Planets).where(Planets.id == planet_favorite.planet_id)).scalar()
-        if planet_record:
-            favorite_planets_data.append({
-                "uid": planet_record.id,
-                "name": planet_record.name,
-                "url": f"/api/planets/{planet_record.id}"
-            })
-    favorite_vehicles_data = []
-    for vehicle_favorite in vehicle_favorites_list:
-        vehicle_record = db.session.execute(db.select(Vehicles).where(Vehicles.id == vehicle_favorite.vehicle_id)).scalar()
-        if vehicle_record:
-            favorite_vehicles_data.append({
-                "uid": vehicle_record.id,
-                "name": vehicle_record.name,
-                "url": f"/api/vehicles/{vehicle_record.id}"
-            })
-    favorites = {
-        "people": favorite_characters_data,
-        "planets": favorite_planets_data,
-        "vehicles": favorite_vehicles_data
-    }
-    response_body['results'] = favorites
+    response_body['results'] = list_favorites(current_user_id)
     response_body['message'] = 'Favoritos del usuario'
     return response_body, 200
 
@@ -174,9 +161,9 @@ def user_favorites():
 def posts():
     response_body = {}
     if request.method == 'GET':
-        rows = db.session.execute(db.select(Posts)).scalars().all()
-        results = [row.serialize() for row in rows]
+        results, next_url = list_posts(request.args.get('user_id'))
         response_body['results'] = results
+        response_body['next'] = next_url
         response_body['message'] = 'Listado de Posts'
         return response_body, 200
     if request.method == 'POST':
@@ -188,28 +175,35 @@ def posts():
         row = Posts(title=data.get('title'), description=data.get('description'), body=data.get('body'), image_url=data.get('image_url'), user_id=data.get('user_id'))
         db.session.add(row)
         db.session.commit()
+        publish_post(row)
         response_body['results'] = row.serialize()
         response_body['message'] = 'Post creado'
         return response_body, 201
 
+@api.route('/feed', methods=['GET'])
+@jwt_required()
+def feed():
+    response_body = {}
+    results, next_url = get_feed(current_user_id)
+    response_body['results'] = results
+    response_body['next'] = next_url
+    response_body['message'] = 'Posts de las cuentas que sigues'
+    return response_body, 200
+
 @api.route('/posts/<int:post_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
 def post(post_id):
     response_body = {}
     if request.method == 'GET':
-        row = db.session.execute(db.select(Posts).where(Posts.id == post_id)).scalar()
-        if not row:
-            raise APIException("Post not found", 404)
-        response_body['results'] = row.serialize()
+        response_body['results'] = get_post(post_id)
         response_body['message'] = 'Contenido del post'
         return response_body, 200
     if request.method == 'PUT':
         row = db.session.execute(db.select(Posts).where(Posts.id == post_id)).scalar()
         if not row:
             raise APIException("Post not found", 404)
-        data = request.json
-        for key, value in data.items():
-            setattr(row, key, value)
+        if update_post(row, request.json):
+            move_post_entries(post_id, row.date)
         db.session.commit()
         response_body['results'] = row.serialize()
         response_body['message'] = 'Post actualizado'
@@ -218,12 +212,23 @@ def post(post_id):
         row = db.session.execute(db.select(Posts).where(Posts.id == post_id)).scalar()
         if not row:
             raise APIException("Post not found", 404)
+        remove_post_entries(post_id)
         db.session.delete(row)
         db.session.commit()
         response_body['results'] = None
         response_body['message'] = 'Post eliminado'
         return response_body, 200
 
+@api.route('/posts/<int:post_id>/comments', methods=['GET'])
+@jwt_required()
+def post_comments(post_id):
+    response_body = {}
+    results, next_url = list_comments(post_id)
+    response_body['results'] = results
+    response_body['next'] = next_url
+    response_body['message'] = 'Comentarios del post'
+    return response_body, 200
+
 @api.route('/comments', methods=['GET', 'POST'])
 @jwt_required()
 def comments():
@@ -246,6 +251,7 @@ def comments():
             raise APIException("Post not found", 500)
         row = Comments(body=data.get('body'), user_id=data.get('user_id'), post_id=data.get('post_id'))
         db.session.add(row)
+        count_comment(post_record.id, 1)
         db.session.commit()
         response_body['results'] = row.serialize()
         response_body['message'] = 'Comentario creado'
@@ -258,6 +264,7 @@ def comment(comment_id):
     row = db.session.execute(db.select(Comments).where(Comments.id == comment_id)).scalar()
     if not row:
         raise APIException("Comment not found", 404)
+    count_comment(row.post_id, -1)
     db.session.delete(row)
     db.session.commit()
     response_body['results'] = None
@@ -279,17 +286,24 @@ def followers():
 def follow(user_id):
     response_body = {}
     if request.method == 'POST':
-        row = Followers(following_id=user_id, follower_id=current_user_id)
-        db.session.add(row)
-        db.session.commit()
+        row = db.session.execute(insert_ignore(Followers)
+                                 .values(following_id=user_id, follower_id=current_user_id)
+                                 .returning(Followers)).scalar()
+        if not row:
+            raise APIException("Already following this user", 400)
         response_body['results'] = row.serialize()
+        add_followed_posts(current_user_id, user_id)
+        db.session.commit()
         response_body['message'] = 'Ahora sigues al usuario'
         return response_body, 201
     if request.method == 'DELETE':
-        row = db.session.execute(db.select(Followers).where(Followers.following_id == user_id, Followers.follower_id == current_user_id)).scalar()
-        if not row:
+        deleted = db.session.execute(db.delete(Followers)
+                                     .where(Followers.following_id == user_id,
+                                            Followers.follower_id == current_user_id)
+                                     .returning(Followers.id)).scalar()
+        if not deleted:
             raise APIException("Follow relationship not found", 404)
-        db.session.delete(row)
+        remove_followed_posts(current_user_id, user_id)
         db.session.commit()
         response_body['results'] = None
         response_body['message'] = 'Has dejado de seguir al usuario'
@@ -300,39 +314,79 @@ def follow(user_id):
 def people():
     response_body = {}
     if request.method == 'GET':
-        rows = db.session.execute(db.select(Characters)).scalars().all()
-        results = [row.serialize() for row in rows]
-        response_body['results'] = results
+        etag = catalog_etag('people', request.full_path)
+        if not_modified(etag):
+            return not_modified_response(etag)
+        cached = cached_body(etag)
+        if cached:
+            return cached
+        response_body.update(list_catalog(Characters))
         response_body['message'] = 'Listado de Personajes'
-        return response_body, 200
+        return cache_body(etag, response_body)
     if request.method == 'POST':
         data = request.json
         row = Characters(**data)
         db.session.add(row)
+        db.session.flush()
+        index_document(row)
+        count_row(row)
+        bump_version('people')
         db.session.commit()
+        name_index.add(row)
         response_body['results'] = row.serialize()
         response_body['message'] = 'Personaje creado'
         return response_body, 201
 
+@api.route('/people/batch', methods=['POST'])
+@jwt_required()
+def people_batch():
+    response_body = {}
+    rows = create_batch(Characters, request.json)
+    index_new_documents(rows)
+    update_facets('people', added=[facet_values(row) for row in rows])
+    bump_version('people')
+    # Serialized before the commit expires the rows, that would reload them one by one
+    results = [{"index": index, **row.serialize()} for index, row in enumerate(rows)]
+    db.session.commit()
+    name_index.add_many('people', [(row['uid'], row['name']) for row in results])
+    response_body['results'] = results
+    response_body['message'] = 'Personajes creados'
+    return response_body, 201
+
 @api.route('/people/<int:people_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
 def person(people_id):
     response_body = {}
     if request.method == 'GET':
-        row = db.session.execute(db.select(Characters).where(Characters.id == people_id)).scalar()
-        if not row:
-            raise APIException("Person not found", 404)
-        response_body['results'] = row.serialize()
+        cached = detail_cache.get(("people", people_id))
+        if cached is None:
+            generation = detail_cache.generation()
+            etag = catalog_etag('people', people_id)
+            row = db.session.execute(db.select(Characters).where(Characters.id == people_id)).scalar()
+            if not row:
+                raise APIException("Person not found", 404)
+            cached = (etag, row.serialize())
+            detail_cache.set(("people", people_id), cached, generation)
+        etag, results = cached
+        if not_modified(etag):
+            return '', 304, {'ETag': quote_etag(etag)}
+        response_body['results'] = results
         response_body['message'] = 'Personaje encontrado'
-        return response_body, 200
+        return response_body, 200, {'ETag': quote_etag(etag)}
     if request.method == 'PUT':
         row = db.session.execute(db.select(Characters).where(Characters.id == people_id)).scalar()
         if not row:
             raise APIException("Person not found", 404)
-        data = request.json
+        data = writable_fields(Characters, request.json)
+        before = facet_values(row)
         for key, value in data.items():
             setattr(row, key, value)
+        index_document(row)
+        update_facets('people', removed=[before], added=[facet_values(row)])
+        bump_version('people')
         db.session.commit()
+        detail_cache.delete(("people", people_id))
+        name_index.add(row)
         response_body['results'] = row.serialize()
         response_body['message'] = 'Personaje actualizado'
         return response_body, 200
@@ -340,8 +394,15 @@ def person(people_id):
         row = db.session.execute(db.select(Characters).where(Characters.id == people_id)).scalar()
         if not row:
             raise APIException("Person not found", 404)
+        remove_document(row)
+        uncount_row(row)
+        remove_entity_favorites('people', people_id)
+        remove_related('people', people_id)
         db.session.delete(row)
+        bump_version('people')
         db.session.commit()
+        detail_cache.delete(("people", people_id))
+        name_index.remove(row)
         response_body['results'] = None
         response_body['message'] = 'Personaje eliminado'
         return response_body, 200
@@ -351,39 +412,79 @@ def person(people_id):
 def planets():
     response_body = {}
     if request.method == 'GET':
-        rows = db.session.execute(db.select(Planets)).scalars().all()
-        results = [row.serialize() for row in rows]
-        response_body['results'] = results
+        etag = catalog_etag('planets', request.full_path)
+        if not_modified(etag):
+            return not_modified_response(etag)
+        cached = cached_body(etag)
+        if cached:
+            return cached
+        response_body.update(list_catalog(Planets))
         response_body['message'] = 'Listado de Planetas'
-        return response_body, 200
+        return cache_body(etag, response_body)
     if request.method == 'POST':
         data = request.json
         row = Planets(**data)
         db.session.add(row)
+        db.session.flush()
+        index_document(row)
+        count_row(row)
+        bump_version('planets')
         db.session.commit()
+        name_index.add(row)
         response_body['results'] = row.serialize()
         response_body['message'] = 'Planeta creado'
         return response_body, 201
 
+@api.route('/planets/batch', methods=['POST'])
+@jwt_required()
+def planets_batch():
+    response_body = {}
+    rows = create_batch(Planets, request.json)
+    index_new_documents(rows)
+    update_facets('planets', added=[facet_values(row) for row in rows])
+    bump_version('planets')
+    # Serialized before the commit expires the rows, that would reload them one by one
+    results = [{"index": index, **row.serialize()} for index, row in enumerate(rows)]
+    db.session.commit()
+    name_index.add_many('planets', [(row['uid'], row['name']) for row in results])
+    response_body['results'] = results
+    response_body['message'] = 'Planetas creados'
+    return response_body, 201
+
 @api.route('/planets/<int:planet_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
 def planet(planet_id):
     response_body = {}
     if request.method == 'GET':
-        row = db.session.execute(db.select(Planets).where(Planets.id == planet_id)).scalar()
-        if not row:
-            raise APIException("Planet not found", 404)
-        response_body['results'] = row.serialize()
+        cached = detail_cache.get(("planets", planet_id))
+        if cached is None:
+            generation = detail_cache.generation()
+            etag = catalog_etag('planets', planet_id)
+            row = db.session.execute(db.select(Planets).where(Planets.id == planet_id)).scalar()
+            if not row:
+                raise APIException("Planet not found", 404)
+            cached = (etag, row.serialize())
+            detail_cache.set(("planets", planet_id), cached, generation)
+        etag, results = cached
+        if not_modified(etag):
+            return '', 304, {'ETag': quote_etag(etag)}
+        response_body['results'] = results
         response_body['message'] = 'Planeta encontrado'
-        return response_body, 200
+        return response_body, 200, {'ETag': quote_etag(etag)}
     if request.method == 'PUT':
         row = db.session.execute(db.select(Planets).where(Planets.id == planet_id)).scalar()
         if not row:
             raise APIException("Planet not found", 404)
-        data = request.json
+        data = writable_fields(Planets, request.json)
+        before = facet_values(row)
         for key, value in data.items():
             setattr(row, key, value)
+        index_document(row)
+        update_facets('planets', removed=[before], added=[facet_values(row)])
+        bump_version('planets')
         db.session.commit()
+        detail_cache.delete(("planets", planet_id))
+        name_index.add(row)
         response_body['results'] = row.serialize()
         response_body['message'] = 'Planeta actualizado'
         return response_body, 200
@@ -391,8 +492,15 @@ def planet(planet_id):
         row = db.session.execute(db.select(Planets).where(Planets.id == planet_id)).scalar()
         if not row:
             raise APIException("Planet not found", 404)
+        remove_document(row)
+        uncount_row(row)
+        remove_entity_favorites('planets', planet_id)
+        remove_related('planets', planet_id)
         db.session.delete(row)
+        bump_version('planets')
         db.session.commit()
+        detail_cache.delete(("planets", planet_id))
+        name_index.remove(row)
         response_body['results'] = None
         response_body['message'] = 'Planeta eliminado'
         return response_body, 200
@@ -402,21 +510,20 @@ def planet(planet_id):
 def handle_people_fav(people_id):
     response_body = {}
     if request.method == 'POST':
-        existing_fav = db.session.execute(db.select(CharacterFavorites).where(CharacterFavorites.user_id == current_user_id, CharacterFavorites.character_id == people_id)).scalar()
-        if existing_fav:
+        fav = add_favorite(current_user_id, 'people', people_id)
+        if not fav:
             raise APIException("This character is already a favorite", 400)
-        fav = CharacterFavorites(user_id=current_user_id, character_id=people_id)
-        db.session.add(fav)
+        response_body['results'] = favorite_result(fav)
         db.session.commit()
-        response_body['results'] = fav.serialize()
+        refresh_related_later(current_user_id, [('people', people_id)])
         response_body['message'] = 'Favorito añadido'
         return response_body, 201
     if request.method == 'DELETE':
-        fav = db.session.execute(db.select(CharacterFavorites).where(CharacterFavorites.user_id == current_user_id, CharacterFavorites.character_id == people_id)).scalar()
+        fav = remove_favorite(current_user_id, 'people', people_id)
         if not fav:
             raise APIException("Favorite not found", 404)
-        db.session.delete(fav)
         db.session.commit()
+        refresh_related_later(current_user_id, [('people', people_id)])
         response_body['results'] = None
         response_body['message'] = 'Favorito eliminado'
         return response_body, 200
@@ -426,21 +533,20 @@ def handle_people_fav(people_id):
 def handle_planet_fav(planet_id):
     response_body = {}
     if request.method == 'POST':
-        existing_fav = db.session.execute(db.select(PlanetFavorites).where(PlanetFavorites.user_id == current_user_id, PlanetFavorites.planet_id == planet_id)).scalar()
-        if existing_fav:
+        fav = add_favorite(current_user_id, 'planets', planet_id)
+        if not fav:
             raise APIException("This planet is already a favorite", 400)
-        fav = PlanetFavorites(user_id=current_user_id, planet_id=planet_id)
-        db.session.add(fav)
+        response_body['results'] = favorite_result(fav)
         db.session.commit()
-        response_body['results'] = fav.serialize()
+        refresh_related_later(current_user_id, [('planets', planet_id)])
         response_body['message'] = 'Favorito añadido'
         return response_body, 201
     if request.method == 'DELETE':
-        fav = db.session.execute(db.select(PlanetFavorites).where(PlanetFavorites.user_id == current_user_id, PlanetFavorites.planet_id == planet_id)).scalar()
+        fav = remove_favorite(current_user_id, 'planets', planet_id)
         if not fav:
             raise APIException("Favorite not found", 404)
-        db.session.delete(fav)
         db.session.commit()
+        refresh_related_later(current_user_id, [('planets', planet_id)])
         response_body['results'] = None
         response_body['message'] = 'Favorito eliminado'
         return response_body, 200
@@ -450,11 +556,15 @@ def handle_planet_fav(planet_id):
 def vehicles():
     response_body = {}
     if request.method == 'GET':
-        vehicle_list = db.session.execute(db.select(Vehicles)).scalars().all()
-        results = [vehicle.serialize() for vehicle in vehicle_list]
-        response_body['results'] = results
+        etag = catalog_etag('vehicles', request.full_path)
+        if not_modified(etag):
+            return not_modified_response(etag)
+        cached = cached_body(etag)
+        if cached:
+            return cached
+        response_body.update(list_catalog(Vehicles))
         response_body['message'] = 'Listado de Vehiculos'
-        return response_body, 200
+        return cache_body(etag, response_body)
     if request.method == 'POST':
         data = request.json
         if not data.get('name'):
@@ -467,30 +577,66 @@ def vehicles():
             raise APIException("Vehicle class is required", 400)
         new_vehicle = Vehicles(**data)
         db.session.add(new_vehicle)
+        db.session.flush()
+        index_document(new_vehicle)
+        count_row(new_vehicle)
+        bump_version('vehicles')
         db.session.commit()
+        name_index.add(new_vehicle)
         response_body['results'] = new_vehicle.serialize()
         response_body['message'] = 'Vehiculo creado'
         return response_body, 201
 
+@api.route('/vehicles/batch', methods=['POST'])
+@jwt_required()
+def vehicles_batch():
+    response_body = {}
+    rows = create_batch(Vehicles, request.json)
+    index_new_documents(rows)
+    update_facets('vehicles', added=[facet_values(row) for row in rows])
+    bump_version('vehicles')
+    # Serialized before the commit expires the rows, that would reload them one by one
+    results = [{"index": index, **row.serialize()} for index, row in enumerate(rows)]
+    db.session.commit()
+    name_index.add_many('vehicles', [(row['uid'], row['name']) for row in results])
+    response_body['results'] = results
+    response_body['message'] = 'Vehiculos creados'
+    return response_body, 201
+
 @api.route('/vehicles/<int:vehicle_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
 def vehicle(vehicle_id):
     response_body = {}
     if request.method == 'GET':
-        vehicle = db.session.execute(db.select(Vehicles).where(Vehicles.id == vehicle_id)).scalar()
-        if not vehicle:
-            raise APIException("Vehicle not found", 404)
-        response_body['results'] = vehicle.serialize()
+        cached = detail_cache.get(("vehicles", vehicle_id))
+        if cached is None:
+            generation = detail_cache.generation()
+            etag = catalog_etag('vehicles', vehicle_id)
+            vehicle = db.session.execute(db.select(Vehicles).where(Vehicles.id == vehicle_id)).scalar()
+            if not vehicle:
+                raise APIException("Vehicle not found", 404)
+            cached = (etag, vehicle.serialize())
+            detail_cache.set(("vehicles", vehicle_id), cached, generation)
+        etag, results = cached
+        if not_modified(etag):
+            return '', 304, {'ETag': quote_etag(etag)}
+        response_body['results'] = results
         response_body['message'] = 'Vehiculo encontrado'
-        return response_body, 200
+        return response_body, 200, {'ETag': quote_etag(etag)}
     if request.method == 'PUT':
         vehicle = db.session.execute(db.select(Vehicles).where(Vehicles.id == vehicle_id)).scalar()
         if not vehicle:
             raise APIException("Vehicle not found", 404)
-        data = request.json
+        data = writable_fields(Vehicles, request.json)
+        before = facet_values(vehicle)
         for key, value in data.items():
             setattr(vehicle, key, value)
+        index_document(vehicle)
+        update_facets('vehicles', removed=[before], added=[facet_values(vehicle)])
+        bump_version('vehicles')
         db.session.commit()
+        detail_cache.delete(("vehicles", vehicle_id))
+        name_index.add(vehicle)
         response_body['results'] = vehicle.serialize()
         response_body['message'] = 'Vehiculo actualizado'
         return response_body, 200
@@ -498,8 +644,15 @@ def vehicle(vehicle_id):
         vehicle = db.session.execute(db.select(Vehicles).where(Vehicles.id == vehicle_id)).scalar()
         if not vehicle:
             raise APIException("Vehicle not found", 404)
+        remove_document(vehicle)
+        uncount_row(vehicle)
+        remove_entity_favorites('vehicles', vehicle_id)
+        remove_related('vehicles', vehicle_id)
         db.session.delete(vehicle)
+        bump_version('vehicles')
         db.session.commit()
+        detail_cache.delete(("vehicles", vehicle_id))
+        name_index.remove(vehicle)
         response_body['results'] = None
         response_body['message'] = 'Vehiculo eliminado'
         return response_body, 200
@@ -509,22 +662,82 @@ def vehicle(vehicle_id):
 def handle_vehicle_fav(vehicle_id):
     response_body = {}
     if request.method == 'POST':
-        existing_favorite = db.session.execute(db.select(VehicleFavorites).where(VehicleFavorites.user_id == current_user_id, VehicleFavorites.vehicle_id == vehicle_id)).scalar()
-        if existing_favorite:
+        fav = add_favorite(current_user_id, 'vehicles', vehicle_id)
+        if not fav:
             raise APIException("This vehicle is already a favorite", 400)
-        new_favorite = VehicleFavorites(user_id=current_user_id, vehicle_id=vehicle_id)
-        db.session.add(new_favorite)
+        response_body['results'] = favorite_result(fav)
         db.session.commit()
-        response_body['results'] = new_favorite.serialize()
+        refresh_related_later(current_user_id, [('vehicles', vehicle_id)])
         response_body['message'] = 'Favorito añadido'
         return response_body, 201
     if request.method == 'DELETE':
-        favorite = db.session.execute(db.select(VehicleFavorites).where(VehicleFavorites.user_id == current_user_id, VehicleFavorites.vehicle_id == vehicle_id)).scalar()
-        if not favorite:
+        fav = remove_favorite(current_user_id, 'vehicles', vehicle_id)
+        if not fav:
             raise APIException("Favorite not found", 404)
-        db.session.delete(favorite)
         db.session.commit()
+        refresh_related_later(current_user_id, [('vehicles', vehicle_id)])
         response_body['results'] = None
         response_body['message'] = 'Favorito eliminado'
         return response_body, 200
 
+@api.route('/search', methods=['GET'])
+@jwt_required()
+def search_catalog():
+    response_body = {}
+    results, next_url = search(request.args.get('q', ''))
+    response_body['results'] = results
+    response_body['next'] = next_url
+    response_body['message'] = 'Resultados de la búsqueda'
+    return response_body, 200
+
+@api.route('/autocomplete', methods=['GET'])
+@jwt_required()
+def autocomplete_names():
+    response_body = {}
+    limit = get_page_size(default=10)
+    response_body['results'] = autocomplete(request.args.get('prefix', ''), limit)
+    response_body['message'] = 'Sugerencias'
+    return response_body, 200
+
+@api.route('/<entity>/<int:entity_id>/related', methods=['GET'])
+@jwt_required()
+def related(entity, entity_id):
+    response_body = {}
+    limit = get_page_size(default=10)
+    response_body['results'] = get_related(entity, entity_id, limit)
+    response_body['message'] = 'Favoritos relacionados'
+    return response_body, 200
+
+@api.route('/leaderboard/<entity>', methods=['GET'])
+@jwt_required()
+def favorites_leaderboard(entity):
+    response_body = {}
+    limit = get_page_size(default=10)
+    response_body['results'] = leaderboard(entity, limit)
+    response_body['message'] = 'Los más favoritos'
+    return response_body, 200
+
+@api.route('/facets/<entity>', methods=['GET'])
+@jwt_required()
+def facets(entity):
+    response_body = {}
+    etag = catalog_etag(entity, 'facets')
+    if not_modified(etag):
+        return '', 304, {'ETag': quote_etag(etag)}
+    response_body['results'] = get_facets(entity)
+    response_body['message'] = 'Conteos por faceta'
+    return response_body, 200, {'ETag': quote_etag(etag)}
+
+@api.route('/export/<table>.ndjson', methods=['GET'])
+@jwt_required()
+def export_table(table):
+    return export_response(table)
+
+@api.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    response_body = {}
+    response_body['results'] = {"detail": detail_cache.stats(),
+                                "lists": body_cache.stats()}
+    response_body['message'] = 'Estadisticas de la cache'
+    return response_body, 200
@@ -0,0 +1,140 @@
+"""
+Full text search over the catalog (people, planets and vehicles).
+Every entity has its own search table keyed by the entity id:
+an FTS5 virtual table on SQLite and a table with a GIN indexed tsvector on
+Postgres. The catalog handlers keep them up to date through index_document
+and remove_document, inside the same transaction as the row change.
+"""
+import re
+import sqlalchemy as sa
+from api.models import db
+from api.utils import APIException, paginate
+from api.catalog import CATALOG_MODELS, entity_of
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS {entity}_search USING fts5(
+        name, content, tokenize = 'unicode61 remove_diacritics 2')""",
+]
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS {entity}_search (
+        id INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        content VARCHAR NOT NULL,
+        document TSVECTOR GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', name), 'A') ||
+            setweight(to_tsvector('simple', content), 'B')) STORED)""",
+    """CREATE INDEX IF NOT EXISTS ix_{entity}_search_document
+        ON {entity}_search USING GIN (document)""",
+]
+
+
+def is_postgres():
+    return db.session.get_bind().dialect.name == "postgresql"
+
+
+def search_table(entity):
+    """Returns the search table of an entity and the column holding the entity id"""
+    # SQLite FTS tables use the implicit rowid as the entity id
+    key = sa.column("id" if is_postgres() else "rowid")
+    table = sa.table(f"{entity}_search", key, sa.column("name"),
+                     sa.column("content"), sa.column("document"))
+    return table, key
+
+
+def document_content(row):
+    values = [getattr(row, field) for field in row.filter_fields
+              if field != "name"]
+    return " ".join(value for value in values if value)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Keeps `flask db migrate` from dropping the search tables (and the FTS5
+    shadow tables), they are not declared as models.
+    """
+    search_tables = tuple(f"{entity}_search" for entity in CATALOG_MODELS)
+    return not (type_ == "table" and reflected and name.startswith(search_tables))
+
+
+def create_search_tables():
+    ddl = POSTGRES_DDL if is_postgres() else SQLITE_DDL
+    for entity in CATALOG_MODELS:
+        for statement in ddl:
+            db.session.execute(sa.text(statement.format(entity=entity)))
+
+
+def remove_document(row):
+    table, key = search_table(entity_of(row))
+    db.session.execute(sa.delete(table).where(key == row.id))
+
+
+def index_document(row):
+    """Adds or replaces the search document of a catalog row (call it after a flush)"""
+    remove_document(row)
+    table, key = search_table(entity_of(row))
+    db.session.execute(sa.insert(table).values({key.key: row.id,
+                                                "name": row.name,
+                                                "content": document_content(row)}))
+
+
+def index_new_documents(rows):
+    """Indexes rows of one entity that were just inserted, in a single statement"""
+    if not rows:
+        return
+    table, key = search_table(entity_of(rows[0]))
+    db.session.execute(sa.insert(table), [{key.key: row.id,
+                                           "name": row.name,
+                                           "content": document_content(row)}
+                                          for row in rows])
+
+
+def rebuild_search_index():
+    create_search_tables()
+    for entity, model in CATALOG_MODELS.items():
+        table, key = search_table(entity)
+        db.session.execute(sa.delete(table))
+        rows = db.session.execute(db.select(model)).scalars()
+        documents = [{key.key: row.id, "name": row.name,
+                      "content": document_content(row)} for row in rows]
+        if documents:
+            db.session.execute(sa.insert(table), documents)
+    db.session.commit()
+
+
+def match_query(text):
+    # User input never reaches the MATCH / tsquery syntax, only its words do.
+    # Each word is matched as a prefix so "skyw" finds "Skywalker"
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        raise APIException("Query is required", 400)
+    if is_postgres():
+        return " & ".join(f"{word}:*" for word in words)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def ranked_select(entity, query):
+    table, key = search_table(entity)
+    if is_postgres():
+        tsquery = sa.func.to_tsquery("simple", query)
+        rank = -sa.func.ts_rank(table.c.document, tsquery)
+        condition = table.c.document.op("@@")(tsquery)
+    else:
+        # bm25 is lower for better matches, names weigh ten times the rest
+        rank = sa.func.bm25(sa.literal_column(table.name), 10.0, 1.0)
+        condition = sa.text(f"{table.name} MATCH :query").bindparams(query=query)
+    return sa.select(sa.literal(entity).label("entity"), key.label("id"),
+                     table.c.name, rank.label("rank")).where(condition)
+
+
+def search(text):
+    query = match_query(text)
+    results = sa.union_all(*[ranked_select(entity, query)
+                             for entity in CATALOG_MODELS]).subquery()
+    keys = [(results.c.rank, False), (results.c.entity, False),
+            (results.c.id, False)]
+    rows, next_url = paginate(sa.select(results), keys, scalars=False)
+    return [{"type": row.entity,
+             "uid": row.id,
+             "name": row.name,
+             "url": f"/api/{row.entity}/{row.id}"} for row in rows], next_url
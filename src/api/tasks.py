@@ -0,0 +1,27 @@
+"""
+Work that should not delay the response (recommendation refreshes, timeline
+fan-out). Tasks run in a small thread pool of the worker process, each one
+with its own app context and session. They are lost if the process dies,
+the matching rebuild commands catch up with anything missed.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from api.models import db
+
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("BACKGROUND_WORKERS", 2)),
+                              thread_name_prefix="background")
+
+
+def run_in_background(func, *args):
+    """Runs func(*args) after the request, returns its future"""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                func(*args)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Background task %s failed", func.__name__)
+    return executor.submit(run)
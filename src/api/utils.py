@@ -1,4 +1,15 @@
-from flask import jsonify, url_for
+import base64
+import json
+from datetime import datetime
+from flask import g, has_request_context, jsonify, request, url_for
+from sqlalchemy import DateTime, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from api.models import db
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
 
 class APIException(Exception):
@@ -17,6 +28,121 @@ class APIException(Exception):
         return rv
 
 
+def upsert_insert(model):
+    """INSERT of the database dialect, the one that has ON CONFLICT clauses"""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def insert_ignore(model):
+    """INSERT ... ON CONFLICT DO NOTHING, skipped rows are not RETURNed"""
+    return upsert_insert(model).on_conflict_do_nothing()
+
+
+def encode_cursor(*values):
+    values = [value.isoformat() if isinstance(value, datetime) else value
+              for value in values]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise APIException("Invalid cursor", 400)
+    if not isinstance(values, list):
+        raise APIException("Invalid cursor", 400)
+    return values
+
+
+def get_page_size(default=DEFAULT_PAGE_SIZE):
+    limit = request.args.get("limit", default)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise APIException("Invalid limit", 400)
+    if limit < 1:
+        raise APIException("Invalid limit", 400)
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def next_page_url(cursor, cursor_arg="after"):
+    # Keep every other query arg (limit, filters...) so the next link
+    # returns the same view of the table
+    args = request.args.to_dict(flat=False)
+    args[cursor_arg] = cursor
+    return url_for(request.endpoint, **request.view_args, **args)
+
+
+def key_value(column, value):
+    """Turns a cursor value back into the type of its key column"""
+    if value is None or not isinstance(column.type, DateTime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise APIException("Invalid cursor", 400)
+
+
+def seek_after(keys, values):
+    """
+    WHERE clause that keeps the rows placed after `values` in the
+    ORDER BY of `keys`. NULLs are always sorted last.
+    """
+    clauses = []
+    equal = []
+    for (column, descending), value in zip(keys, values):
+        if value is None:
+            after = None
+            same = column.is_(None)
+        else:
+            after = column < value if descending else column > value
+            if getattr(column, "nullable", False):
+                after = db.or_(after, column.is_(None))
+            same = column == value
+        if after is not None:
+            clauses.append(db.and_(*equal, after))
+        equal.append(same)
+    return db.or_(*clauses)
+
+
+def paginate(stmt, keys, scalars=True, cursor_arg="after"):
+    """
+    Keyset pagination. `keys` is a list of (column, descending) pairs and the
+    last one has to be unique (usually the id).
+    Reads one extra row to know if there is a next page, so the cost of a page
+    does not depend on how deep into the table it is.
+    Use scalars=False when `stmt` selects columns instead of a model, the
+    key columns have to be part of the select.
+    `cursor_arg` is the query arg holding the cursor ("before" reads better
+    for lists sorted newest first).
+    """
+    limit = get_page_size()
+    after = request.args.get(cursor_arg)
+    if after:
+        values = decode_cursor(after)
+        if len(values) != len(keys):
+            raise APIException("Invalid cursor", 400)
+        values = [key_value(column, value) for (column, descending), value in zip(keys, values)]
+        stmt = stmt.where(seek_after(keys, values))
+    order = []
+    for column, descending in keys:
+        clause = column.desc() if descending else column.asc()
+        nullable = getattr(column, "nullable", False)
+        order.append(clause.nulls_last() if nullable else clause)
+    result = db.session.execute(stmt.order_by(*order).limit(limit + 1))
+    rows = result.scalars().all() if scalars else result.all()
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = [getattr(rows[-1], column.key) for column, descending in keys]
+        next_url = next_page_url(encode_cursor(*last), cursor_arg)
+    return rows, next_url
+
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -45,3 +171,19 @@ def generate_sitemap(app):
             """ + links_html + """
             </ul>
         </div>"""
+
+
+def setup_query_counter(app):
+    """
+    Sends the number of SQL statements run by each request in the
+    X-Query-Count header, used by the tests to catch N+1 queries.
+    """
+    @event.listens_for(Engine, "before_cursor_execute")
+    def count_query(*args):
+        if has_request_context():
+            g.query_count = g.get("query_count", 0) + 1
+
+    @app.after_request
+    def add_query_count(response):
+        response.headers["X-Query-Count"] = str(g.get("query_count", 0))
+        return response
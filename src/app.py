@@ -5,11 +5,13 @@ import os
 from flask import Flask, request, jsonify, url_for, send_from_directory
 from flask_migrate import Migrate
 from flask_swagger import swagger
-from api.utils import APIException, generate_sitemap
+from api.utils import APIException, generate_sitemap, setup_query_counter
 from api.models import db
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
+from api.search import include_object
+from api.autocomplete import setup_autocomplete
 from flask_jwt_extended import JWTManager
 
 
@@ -28,11 +30,14 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-MIGRATE = Migrate(app, db, compare_type=True)
+MIGRATE = Migrate(app, db, compare_type=True, include_object=include_object)
 db.init_app(app)
 # Others configurations
 setup_admin(app)  # Add the admin
 setup_commands(app)  # Add the admin
+if ENV == "development":
+    setup_query_counter(app)  # X-Query-Count header for the tests
+setup_autocomplete(app)  # Catalog names for /autocomplete
 
 # Add all endpoints form the API with a "api" prefix
 app.register_blueprint(api, url_prefix='/api')
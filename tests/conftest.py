@@ -2,6 +2,8 @@
 Pytest configuration and fixtures for API testing.
 Provides base setup, teardown, and utility functions for testing the Flask API.
 """
+import os
+import sys
 import pytest
 import requests
 import time
@@ -10,6 +12,8 @@ from typing import Dict, Any, Optional
 # Base URL for the API
 BASE_URL = "http://localhost:3001/api"
 
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
 
 class APITestClient:
     """Test client wrapper for making API requests with automatic cleanup."""
@@ -287,3 +291,40 @@ def create_test_vehicle(api_client):
         return None
     
     return _create_vehicle
+
+
+@pytest.fixture(scope="session")
+def flask_app(tmp_path_factory):
+    """
+    In process app on a throwaway SQLite database, for the CLI commands
+    that can't be reached through the running API.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-the-cli-tests")
+    sys.path.insert(0, SRC_DIR)
+    from app import app
+    from api.models import db
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app_db(flask_app):
+    """
+    Fixture that provides an app context on the in process database,
+    every table is emptied after the test.
+    """
+    from api.models import db
+    with flask_app.app_context():
+        yield db
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def cli_runner(flask_app):
+    """Fixture that runs `flask <command>` against the in process app."""
+    return flask_app.test_cli_runner()
@@ -0,0 +1,56 @@
+"""
+Tests for the catalog names typeahead.
+Covers: GET /autocomplete?prefix=
+"""
+import pytest
+import time
+
+
+class TestAutocomplete:
+    """Tests for GET /autocomplete endpoint."""
+    
+    def test_autocomplete_prefix(self, api_client, create_test_character):
+        """Test GET /autocomplete returns names starting with the prefix."""
+        timestamp = int(time.time() * 1000)
+        character = create_test_character(name=f'Typeahead{timestamp} Solo')
+        
+        response = api_client.get('/autocomplete', params={'prefix': f'typeahead{timestamp}'})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data['message'] == 'Sugerencias'
+        assert data['results'][0]['uid'] == character['uid']
+        assert data['results'][0]['type'] == 'people'
+    
+    def test_autocomplete_matches_later_words(self, api_client, create_test_planet):
+        """Test GET /autocomplete matches the start of any word of the name."""
+        timestamp = int(time.time() * 1000)
+        planet = create_test_planet(name=f'Outer Rim{timestamp}')
+        
+        response = api_client.get('/autocomplete', params={'prefix': f'rim{timestamp}'})
+        uids = [(r['type'], r['uid']) for r in response.json()['results']]
+        assert ('planets', planet['uid']) in uids
+    
+    def test_autocomplete_fuzzy_fallback(self, api_client, create_test_vehicle):
+        """Test GET /autocomplete still finds a name with a typo in it."""
+        vehicle = create_test_vehicle(name=f'Xqzwalker Transport {int(time.time() * 1000)}')
+        
+        response = api_client.get('/autocomplete', params={'prefix': 'xqzwlaker transport'})
+        uids = [(r['type'], r['uid']) for r in response.json()['results']]
+        assert ('vehicles', vehicle['id']) in uids
+    
+    def test_autocomplete_forgets_deleted_names(self, api_client):
+        """Test a deleted character is no longer suggested."""
+        timestamp = int(time.time() * 1000)
+        create_response = api_client.post('/people', json={'name': f'Ephemeral{timestamp}'})
+        uid = create_response.json()['results']['uid']
+        api_client.delete(f'/people/{uid}')
+        
+        response = api_client.get('/autocomplete', params={'prefix': f'ephemeral{timestamp}'})
+        assert uid not in [r['uid'] for r in response.json()['results'] if r['type'] == 'people']
+    
+    def test_autocomplete_empty_prefix(self, api_client):
+        """Test GET /autocomplete without a prefix returns 400."""
+        response = api_client.get('/autocomplete')
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Prefix is required'
@@ -216,3 +216,55 @@ class TestCommentDelete:
         data = response.json()
         found = any(c['id'] == comment_id for c in data['results'])
         assert not found
+
+
+class TestPostComments:
+    """Tests for GET /posts/<post_id>/comments endpoint."""
+    
+    def test_post_comments_paginated(self, api_client, create_test_user, create_test_post):
+        """Test the comments of a post are returned oldest first, page by page."""
+        user = create_test_user()
+        post = create_test_post(user_id=user['id'])
+        
+        timestamp = int(time.time() * 1000)
+        ids = []
+        for i in range(3):
+            response = api_client.post('/comments', json={
+                'body': f'Thread {i} {timestamp}',
+                'user_id': user['id'],
+                'post_id': post['id']
+            })
+            ids.append(response.json()['results']['id'])
+            api_client.track_resource('comments', ids[-1])
+        
+        response = api_client.get(f'/posts/{post["id"]}/comments', params={'limit': 2})
+        assert response.status_code == 200
+        first_page = response.json()
+        assert first_page['message'] == 'Comentarios del post'
+        assert [c['id'] for c in first_page['results']] == ids[:2]
+        
+        second_page = api_client.get(first_page['next'].replace('/api', '', 1)).json()
+        assert [c['id'] for c in second_page['results']] == ids[2:]
+        assert second_page['next'] is None
+    
+    def test_post_comment_count(self, api_client, create_test_user, create_test_post):
+        """Test comment_count of a post follows comment creation and deletion."""
+        user = create_test_user()
+        post = create_test_post(user_id=user['id'])
+        assert post['comment_count'] == 0
+        
+        response = api_client.post('/comments', json={
+            'body': f'Counted {int(time.time() * 1000)}',
+            'user_id': user['id'],
+            'post_id': post['id']
+        })
+        comment_id = response.json()['results']['id']
+        assert api_client.get(f'/posts/{post["id"]}').json()['results']['comment_count'] == 1
+        
+        api_client.delete(f'/comments/{comment_id}')
+        assert api_client.get(f'/posts/{post["id"]}').json()['results']['comment_count'] == 0
+    
+    def test_post_comments_not_found(self, api_client):
+        """Test GET /posts/<post_id>/comments of a missing post returns 404."""
+        response = api_client.get('/posts/999999/comments')
+        assert response.status_code == 404
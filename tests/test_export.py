@@ -0,0 +1,52 @@
+"""
+Tests for the `flask export-parquet` command.
+They run in process on a throwaway SQLite database (see the flask_app fixture).
+"""
+import pytest
+
+
+def create_users(db, count):
+    from api.models import Users
+    db.session.add_all(Users(email=f'export_{i}@example.com', password='secret', is_active=True,
+                             first_name=f'User {i}') for i in range(count))
+    db.session.commit()
+
+
+class TestExportParquet:
+    """Tests for the export-parquet CLI command."""
+    
+    def test_export_users(self, app_db, cli_runner, tmp_path):
+        """Test the users table is written in batches with its schema, without passwords."""
+        parquet = pytest.importorskip('pyarrow.parquet')
+        create_users(app_db, 5)
+        
+        result = cli_runner.invoke(args=['export-parquet', '--out', str(tmp_path),
+                                         '--table', 'users', '--batch-size', '2'])
+        assert result.exit_code == 0, result.output
+        assert 'users: 5 rows written' in result.output
+        
+        file = parquet.ParquetFile(tmp_path / 'users.parquet')
+        assert file.metadata.num_rows == 5
+        assert file.metadata.num_row_groups == 3
+        schema = file.schema_arrow
+        assert schema.names == ['id', 'email', 'is_active', 'first_name', 'last_name']
+        assert str(schema.field('id').type) == 'int64'
+        assert str(schema.field('is_active').type) == 'bool'
+        assert file.read().column('email').to_pylist()[0] == 'export_0@example.com'
+    
+    def test_export_numeric_stats(self, app_db, cli_runner, tmp_path):
+        """Test the <stat>_num columns of a catalog table are only written with --numeric-stats."""
+        parquet = pytest.importorskip('pyarrow.parquet')
+        from api.models import Characters
+        app_db.session.add(Characters(name='Luke Skywalker', mass='77'))
+        app_db.session.commit()
+        
+        cli_runner.invoke(args=['export-parquet', '--out', str(tmp_path / 'plain'), '--table', 'people'])
+        result = cli_runner.invoke(args=['export-parquet', '--out', str(tmp_path / 'stats'),
+                                         '--table', 'people', '--numeric-stats'])
+        assert result.exit_code == 0, result.output
+        
+        assert 'mass_num' not in parquet.read_schema(tmp_path / 'plain' / 'people.parquet').names
+        table = parquet.read_table(tmp_path / 'stats' / 'people.parquet')
+        assert table.num_rows == 1
+        assert table.column('mass_num').to_pylist() == [77.0]
@@ -26,6 +26,12 @@ class TestCharacterFavorites:
         
         api_client.track_resource('character_favorites', character['uid'])
     
+    def test_add_unknown_character_favorite(self, api_client):
+        """Test POST /favorite/people/<id> of a character that does not exist returns 404."""
+        response = api_client.post('/favorite/people/999999')
+        assert response.status_code == 404
+        assert response.json()['message'] == 'Person not found'
+    
     def test_add_character_favorite_duplicate(self, api_client, create_test_character):
         """Test POST /favorite/people/<id> with duplicate returns 400."""
         character = create_test_character()
@@ -280,3 +286,225 @@ class TestMixedFavorites:
         api_client.track_resource('character_favorites', character['uid'])
         api_client.track_resource('planet_favorites', planet['uid'])
         api_client.track_resource('vehicle_favorites', vehicle['id'])
+    
+    def test_user_favorites_constant_query_count(self, api_client, create_test_character):
+        """Test GET /users/favorites runs the same number of queries for any number of favorites."""
+        def query_count():
+            response = api_client.get('/users/favorites')
+            assert response.status_code == 200
+            if 'X-Query-Count' not in response.headers:
+                pytest.skip('X-Query-Count is only sent with FLASK_DEBUG=1')
+            return int(response.headers['X-Query-Count'])
+        
+        character = create_test_character()
+        api_client.post(f'/favorite/people/{character["uid"]}')
+        api_client.track_resource('character_favorites', character['uid'])
+        before = query_count()
+        
+        for _ in range(3):
+            character = create_test_character()
+            api_client.post(f'/favorite/people/{character["uid"]}')
+            api_client.track_resource('character_favorites', character['uid'])
+        
+        assert query_count() == before
+
+
+class TestFavoritesLeaderboard:
+    """Tests for GET /leaderboard/<entity> endpoint."""
+    
+    def test_leaderboard_counts_follow_favorites(self, api_client, create_test_character):
+        """Test a character's favorite_count goes up and down with its favorite."""
+        character = create_test_character()
+        
+        api_client.post(f'/favorite/people/{character["uid"]}')
+        response = api_client.get('/leaderboard/people', params={'limit': 1000})
+        assert response.status_code == 200
+        counts = {r['uid']: r['favorite_count'] for r in response.json()['results']}
+        assert counts[character['uid']] == 1
+        
+        api_client.delete(f'/favorite/people/{character["uid"]}')
+        response = api_client.get('/leaderboard/people', params={'limit': 1000})
+        assert character['uid'] not in [r['uid'] for r in response.json()['results']]
+    
+    def test_leaderboard_sorted_and_limited(self, api_client):
+        """Test GET /leaderboard/planets returns at most limit rows, most favorited first."""
+        response = api_client.get('/leaderboard/planets', params={'limit': 3})
+        assert response.status_code == 200
+        
+        counts = [r['favorite_count'] for r in response.json()['results']]
+        assert len(counts) <= 3
+        assert counts == sorted(counts, reverse=True)
+    
+    def test_leaderboard_unknown_entity(self, api_client):
+        """Test GET /leaderboard of an unknown entity returns 404."""
+        response = api_client.get('/leaderboard/starships')
+        assert response.status_code == 404
+
+
+class TestFavoritesSync:
+    """Tests for PUT /users/favorites endpoint."""
+    
+    def test_sync_full_set(self, api_client, create_test_character):
+        """Test PUT /users/favorites with the full people set adds and removes favorites."""
+        kept = create_test_character()
+        dropped = create_test_character()
+        added = create_test_character()
+        api_client.post(f'/favorite/people/{kept["uid"]}')
+        api_client.post(f'/favorite/people/{dropped["uid"]}')
+        
+        current = [p['uid'] for p in api_client.get('/users/favorites').json()['results']['people']]
+        wanted = [uid for uid in current if uid != dropped['uid']] + [added['uid']]
+        response = api_client.put('/users/favorites', json={'people': wanted})
+        assert response.status_code == 200
+        assert response.json()['message'] == 'Favoritos actualizados'
+        
+        uids = [p['uid'] for p in response.json()['results']['people']]
+        assert kept['uid'] in uids
+        assert added['uid'] in uids
+        assert dropped['uid'] not in uids
+        
+        api_client.track_resource('character_favorites', kept['uid'])
+        api_client.track_resource('character_favorites', added['uid'])
+    
+    def test_sync_delta(self, api_client, create_test_planet):
+        """Test PUT /users/favorites with add/remove only touches the listed ids."""
+        planet = create_test_planet()
+        
+        response = api_client.put('/users/favorites', json={'add': {'planets': [planet['uid']]}})
+        assert planet['uid'] in [p['uid'] for p in response.json()['results']['planets']]
+        
+        response = api_client.put('/users/favorites', json={'remove': {'planets': [planet['uid']]}})
+        assert planet['uid'] not in [p['uid'] for p in response.json()['results']['planets']]
+    
+    def test_sync_unknown_ids(self, api_client):
+        """Test PUT /users/favorites rejects ids that are not in the catalog."""
+        response = api_client.put('/users/favorites', json={'add': {'vehicles': [999999]}})
+        assert response.status_code == 400
+        assert response.json()['missing'] == [999999]
+
+
+class TestRelatedFavorites:
+    """Tests for GET /<entity>/<id>/related endpoint."""
+    
+    def test_related_after_favorites(self, api_client, create_test_character, create_test_planet):
+        """Test items favorited by the same user show up as related, refreshed in the background."""
+        character = create_test_character()
+        planet = create_test_planet()
+        api_client.post(f'/favorite/people/{character["uid"]}')
+        api_client.post(f'/favorite/planet/{planet["uid"]}')
+        
+        related = []
+        for _ in range(20):
+            response = api_client.get(f'/people/{character["uid"]}/related', params={'limit': 100})
+            assert response.status_code == 200
+            related = [(r['type'], r['uid']) for r in response.json()['results']]
+            if ('planets', planet['uid']) in related:
+                break
+            time.sleep(0.1)
+        assert ('planets', planet['uid']) in related
+        
+        api_client.track_resource('character_favorites', character['uid'])
+        api_client.track_resource('planet_favorites', planet['uid'])
+    
+    def test_related_unknown_entity(self, api_client):
+        """Test GET /<entity>/<id>/related of an unknown entity returns 404."""
+        response = api_client.get('/starships/1/related')
+        assert response.status_code == 404
+
+
+class TestBackfillFavorites:
+    """Tests for the backfill-favorites CLI command, run in process (see the flask_app fixture)."""
+    
+    def seed_legacy_favorites(self, db):
+        from api.models import (Users, Characters, Planets, CharacterFavorites,
+                                PlanetFavorites)
+        db.session.add(Users(id=1, email='legacy@example.com', password='secret',
+                             is_active=True, first_name='Legacy'))
+        db.session.add_all([Characters(id=1, name='Luke Skywalker'),
+                            Characters(id=2, name='Leia Organa'),
+                            Planets(id=1, name='Tatooine', diameter='10465', rotation_period='23',
+                                    orbital_period='304', gravity='1 standard',
+                                    population='200000', climate='arid', terrain='desert')])
+        db.session.flush()
+        # The old tables had no unique constraint, the duplicate is copied once
+        db.session.add_all([CharacterFavorites(user_id=1, character_id=2),
+                            CharacterFavorites(user_id=1, character_id=1),
+                            CharacterFavorites(user_id=1, character_id=1),
+                            PlanetFavorites(user_id=1, planet_id=1)])
+        db.session.commit()
+    
+    def get_favorites(self, flask_app):
+        from flask_jwt_extended import create_access_token
+        token = create_access_token(identity='legacy@example.com')
+        response = flask_app.test_client().get('/api/users/favorites',
+                                               headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        return response.get_json()['results']
+    
+    def favorite_counts(self, db):
+        from api.models import Characters, Planets
+        db.session.expire_all()
+        return {(model.__tablename__, row.id): row.favorite_count
+                for model in (Characters, Planets)
+                for row in db.session.execute(db.select(model)).scalars()}
+    
+    def test_backfill_keeps_favorites_and_counters(self, app_db, cli_runner, flask_app):
+        """Test the backfill copies the legacy rows once, also when it is run again."""
+        self.seed_legacy_favorites(app_db)
+        
+        result = cli_runner.invoke(args=['backfill-favorites'])
+        assert result.exit_code == 0, result.output
+        assert 'people: 2 favorites copied' in result.output
+        assert 'planets: 1 favorites copied' in result.output
+        
+        favorites = self.get_favorites(flask_app)
+        assert sorted(f['uid'] for f in favorites['people']) == [1, 2]
+        assert [f['name'] for f in favorites['planets']] == ['Tatooine']
+        assert favorites['vehicles'] == []
+        counts = self.favorite_counts(app_db)
+        assert counts == {('characters', 1): 1, ('characters', 2): 1, ('planets', 1): 1}
+        
+        result = cli_runner.invoke(args=['backfill-favorites'])
+        assert result.exit_code == 0, result.output
+        assert 'people: 0 favorites copied' in result.output
+        assert self.get_favorites(flask_app) == favorites
+        assert self.favorite_counts(app_db) == counts
+
+
+class TestBuildRecommendations:
+    """Tests for the build-recommendations CLI command, run in process (see the flask_app fixture)."""
+    
+    def test_build_scores_co_favorites(self, app_db, cli_runner):
+        """Test the full build writes the cosine scores of the co-favorited items."""
+        pytest.importorskip('scipy')
+        from api.models import Users, Favorites, RelatedItems
+        from api.recommend import neighbours
+        app_db.session.add_all(Users(id=user_id, email=f'recommend_{user_id}@example.com',
+                                     password='secret', is_active=True, first_name='Fan')
+                               for user_id in (1, 2, 3))
+        app_db.session.flush()
+        favorites = {1: [('people', 1), ('people', 2)],
+                     2: [('people', 1), ('people', 2), ('planets', 1)],
+                     3: [('people', 1), ('planets', 1)]}
+        app_db.session.add_all(Favorites(user_id=user_id, entity_type=entity, entity_id=entity_id)
+                               for user_id, items in favorites.items()
+                               for entity, entity_id in items)
+        app_db.session.commit()
+        
+        result = cli_runner.invoke(args=['build-recommendations'])
+        assert result.exit_code == 0, result.output
+        assert '6 related items written' in result.output
+        
+        scores = {(row.entity_type, row.entity_id, row.related_type, row.related_id): row.score
+                  for row in app_db.session.execute(app_db.select(RelatedItems)).scalars()}
+        # co_favorites / sqrt(favorites_a * favorites_b): people 1 has 3 fans, the others 2
+        assert scores[('people', 1, 'people', 2)] == pytest.approx(2 / 6 ** 0.5)
+        assert scores[('people', 1, 'planets', 1)] == pytest.approx(2 / 6 ** 0.5)
+        assert scores[('people', 2, 'planets', 1)] == pytest.approx(0.5)
+        assert scores[('planets', 1, 'people', 2)] == pytest.approx(0.5)
+        
+        # The incremental refresh computes the same neighbours in SQL
+        for entity, entity_id in [('people', 1), ('people', 2), ('planets', 1)]:
+            for row in neighbours(entity, entity_id):
+                key = (entity, entity_id, row['related_type'], row['related_id'])
+                assert scores[key] == pytest.approx(row['score'])
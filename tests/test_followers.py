@@ -58,6 +58,21 @@ class TestFollowCreate:
         
         api_client.track_resource('followers', user_to_follow['id'])
     
+    def test_follow_user_twice(self, api_client, create_test_user):
+        """Test POST /followers/<user_id> twice returns 400 and keeps one relationship."""
+        user_to_follow = create_test_user(email=f'follow_twice_{int(time.time()*1000)}@example.com')
+        
+        api_client.post(f'/followers/{user_to_follow["id"]}')
+        response = api_client.post(f'/followers/{user_to_follow["id"]}')
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Already following this user'
+        
+        rows = [f for f in api_client.get('/followers').json()['results']
+                if f['following_id'] == user_to_follow['id'] and f['follower_id'] == 1]
+        assert len(rows) == 1
+        
+        api_client.track_resource('followers', user_to_follow['id'])
+    
     def test_follow_user_response_structure(self, api_client, create_test_user):
         """Test POST /followers/<user_id> returns correct response structure."""
         user_to_follow = create_test_user(email=f'follow_struct_{int(time.time()*1000)}@example.com')
@@ -0,0 +1,142 @@
+"""
+Tests for the `flask import-catalog` command.
+They run in process on a throwaway SQLite database (see the flask_app fixture).
+"""
+import json
+
+
+LUKE = {'name': 'Luke Skywalker', 'height': '172', 'mass': '77', 'hair_color': 'blond',
+        'skin_color': 'fair', 'eye_color': 'blue', 'birth_year': '19BBY', 'gender': 'male',
+        'url': 'https://swapi.dev/api/people/1/'}
+LEIA = {'name': 'Leia Organa', 'height': '150', 'mass': '49', 'hair_color': 'brown',
+        'skin_color': 'light', 'eye_color': 'brown', 'birth_year': '19BBY', 'gender': 'female',
+        'url': 'https://swapi.dev/api/people/5/'}
+TATOOINE = {'name': 'Tatooine', 'diameter': '10465', 'rotation_period': '23',
+            'orbital_period': '304', 'gravity': '1 standard', 'population': '200000',
+            'climate': 'arid', 'terrain': 'desert', 'url': 'https://swapi.dev/api/planets/1/'}
+
+
+def people_rows(db):
+    from api.models import Characters
+    return {row.name: row for row in db.session.execute(db.select(Characters)).scalars()}
+
+
+class TestImportCatalog:
+    """Tests for the import-catalog CLI command."""
+
+    def test_import_json_array(self, app_db, cli_runner, tmp_path):
+        """Test a JSON array of mixed records is split by the entity of their url."""
+        path = tmp_path / 'catalog.json'
+        path.write_text(json.dumps([LUKE, LEIA, TATOOINE]))
+
+        result = cli_runner.invoke(args=['import-catalog', str(path)])
+        assert result.exit_code == 0, result.output
+        assert 'people: 2 inserted, 0 updated' in result.output
+        assert 'planets: 1 inserted, 0 updated' in result.output
+
+        rows = people_rows(app_db)
+        assert set(rows) == {'Luke Skywalker', 'Leia Organa'}
+        assert rows['Luke Skywalker'].mass_num == 77.0
+
+    def test_import_ndjson(self, app_db, cli_runner, tmp_path):
+        """Test NDJSON input, one record per line."""
+        path = tmp_path / 'people.ndjson'
+        path.write_text(json.dumps(LUKE) + '\n\n' + json.dumps(LEIA) + '\n')
+
+        result = cli_runner.invoke(args=['import-catalog', str(path)])
+        assert result.exit_code == 0, result.output
+        assert set(people_rows(app_db)) == {'Luke Skywalker', 'Leia Organa'}
+
+    def test_import_swapi_page(self, app_db, cli_runner, tmp_path):
+        """Test a SWAPI page, records wrapped in "properties" and no url, with --entity."""
+        records = [{'properties': {key: value for key, value in LUKE.items() if key != 'url'}}]
+        path = tmp_path / 'page.json'
+        path.write_text(json.dumps({'count': 1, 'next': None, 'results': records}))
+
+        result = cli_runner.invoke(args=['import-catalog', str(path), '--entity', 'people'])
+        assert result.exit_code == 0, result.output
+        assert set(people_rows(app_db)) == {'Luke Skywalker'}
+
+    def test_import_pretty_printed_page(self, app_db, cli_runner, tmp_path):
+        """Test an indented SWAPI page after blank lines, as saved from the API."""
+        path = tmp_path / 'page.json'
+        path.write_text('\n\n' + json.dumps({'count': 2, 'results': [LUKE, LEIA]}, indent=2))
+
+        result = cli_runner.invoke(args=['import-catalog', str(path)])
+        assert result.exit_code == 0, result.output
+        assert set(people_rows(app_db)) == {'Luke Skywalker', 'Leia Organa'}
+
+    def test_reimport_is_idempotent(self, app_db, cli_runner, tmp_path):
+        """Test importing the same file twice updates the rows instead of duplicating them."""
+        path = tmp_path / 'people.json'
+        path.write_text(json.dumps([LUKE, LEIA]))
+
+        cli_runner.invoke(args=['import-catalog', str(path)])
+        result = cli_runner.invoke(args=['import-catalog', str(path)])
+        assert result.exit_code == 0, result.output
+        assert 'people: 0 inserted, 2 updated' in result.output
+        assert len(people_rows(app_db)) == 2
+
+    def test_partial_record_keeps_stored_fields(self, app_db, cli_runner, tmp_path):
+        """Test a record with only some fields leaves the other columns untouched."""
+        path = tmp_path / 'people.json'
+        path.write_text(json.dumps([LUKE]))
+        cli_runner.invoke(args=['import-catalog', str(path)])
+
+        path.write_text(json.dumps([{'name': 'Luke Skywalker', 'mass': '80',
+                                     'url': LUKE['url']}]))
+        result = cli_runner.invoke(args=['import-catalog', str(path)])
+        assert result.exit_code == 0, result.output
+
+        luke = people_rows(app_db)['Luke Skywalker']
+        assert luke.mass == '80'
+        assert luke.mass_num == 80.0
+        assert luke.height == '172'
+        assert luke.height_num == 172.0
+        assert luke.hair_color == 'blond'
+
+    def test_import_bumps_table_version(self, app_db, cli_runner, tmp_path):
+        """Test an import bumps the version of the tables it wrote only."""
+        from api.catalog import get_version
+        people_version = get_version('people')
+        planets_version = get_version('planets')
+        path = tmp_path / 'people.json'
+        path.write_text(json.dumps([LUKE]))
+
+        result = cli_runner.invoke(args=['import-catalog', str(path)])
+        assert result.exit_code == 0, result.output
+
+        app_db.session.rollback()
+        assert get_version('people') == people_version + 1
+        assert get_version('planets') == planets_version
+
+
+class TestCopyBuffer:
+    """Tests for the CSV sent to COPY ... FROM STDIN on Postgres."""
+
+    def test_none_is_an_unquoted_empty_field(self, flask_app):
+        """Test None becomes NULL (unquoted empty) and strings stay quoted, "" included."""
+        from api.importer import copy_buffer
+        rows = [{'name': 'Yoda', 'mass': 'unknown', 'mass_num': None, 'height_num': 66.0},
+                {'name': 'Say "hi"', 'mass': '', 'mass_num': None, 'height_num': None}]
+
+        buffer = copy_buffer(['name', 'mass', 'mass_num', 'height_num'], rows)
+
+        assert buffer.read().splitlines() == ['"Yoda","unknown",,66.0',
+                                              '"Say ""hi""","",,']
+
+
+class TestJSONStream:
+    """Tests for the chunked reader behind import-catalog."""
+
+    def test_page_results_are_streamed(self, flask_app):
+        """Test the records of a page are yielded before the end of the file is read."""
+        import io
+        from api.importer import JSONStream, iter_object
+        page = json.dumps({'count': 123456, 'next': None, 'results': [LUKE, LEIA, TATOOINE]})
+        file = io.StringIO(page)
+
+        records = iter_object(JSONStream(file, chunk_size=16))
+        assert next(records) == LUKE
+        assert file.tell() < len(page)
+        assert list(records) == [LEIA, TATOOINE]
@@ -37,7 +37,7 @@ class TestPostsList:
         assert 'id' in found_post
         assert 'title' in found_post
         assert 'description' in found_post
-        assert 'body' in found_post
+        assert 'body' not in found_post
         assert 'date' in found_post
         assert 'image_url' in found_post
         assert 'user_id' in found_post
@@ -51,14 +51,36 @@ class TestPostsList:
         data = response.json()
         
         assert 'results' in data
+        assert 'next' in data
         assert 'message' in data
         assert isinstance(data['results'], list)
         
         if data['results']:
             post = data['results'][0]
-            expected_fields = {'id', 'title', 'description', 'body', 'date', 'image_url', 'user_id'}
+            expected_fields = {'id', 'title', 'description', 'date', 'image_url', 'user_id', 'comment_count'}
             assert set(post.keys()) == expected_fields
 
+    
+    def test_get_posts_by_user_newest_first(self, api_client, create_test_user, create_test_post):
+        """Test GET /posts?user_id= only returns that user's posts, newest first, page by page."""
+        user = create_test_user()
+        posts = [create_test_post(user_id=user['id'], title=f'Page {i} {int(time.time()*1000)}') for i in range(3)]
+        
+        response = api_client.get('/posts', params={'user_id': user['id'], 'limit': 2})
+        assert response.status_code == 200
+        first_page = response.json()
+        assert [p['id'] for p in first_page['results']] == [posts[2]['id'], posts[1]['id']]
+        assert 'before=' in first_page['next']
+        
+        second_page = api_client.get(first_page['next'].replace('/api', '', 1)).json()
+        assert [p['id'] for p in second_page['results']] == [posts[0]['id']]
+        assert second_page['next'] is None
+    
+    def test_get_posts_invalid_user_id(self, api_client):
+        """Test GET /posts with a user_id that is not a number returns 400."""
+        response = api_client.get('/posts', params={'user_id': 'abc'})
+        assert response.status_code == 400
+
 
 class TestPostsCreate:
     """Tests for POST /posts endpoint."""
@@ -116,7 +138,7 @@ class TestPostsCreate:
         assert data['message'] == 'Post creado'
         
         result = data['results']
-        expected_fields = {'id', 'title', 'description', 'body', 'date', 'image_url', 'user_id'}
+        expected_fields = {'id', 'title', 'description', 'body', 'date', 'image_url', 'user_id', 'comment_count'}
         assert set(result.keys()) == expected_fields
         
         api_client.track_resource('posts', result['id'])
@@ -243,6 +265,18 @@ class TestPostUpdate:
         assert data['results']['title'] == 'OnlyTitleUpdated'
         assert data['results']['description'] == 'Original Desc'
     
+    def test_update_post_ignores_server_fields(self, api_client, create_test_user, create_test_post):
+        """Test PUT /posts/<id> can't change the author, the comment count or the fan-out flag."""
+        user = create_test_user()
+        other = create_test_user(email=f'other_{int(time.time() * 1000)}@example.com')
+        post = create_test_post(user_id=user['id'])
+        
+        response = api_client.put(f'/posts/{post["id"]}', json={'comment_count': 99, 'fanned_out': False,
+                                                               'user_id': other['id'], 'title': post['title']})
+        assert response.status_code == 200
+        assert response.json()['results']['comment_count'] == 0
+        assert response.json()['results']['user_id'] == user['id']
+    
     def test_update_post_not_found(self, api_client):
         """Test PUT /posts/<id> returns 404 for non-existent post."""
         update_data = {'title': 'Updated'}
@@ -327,3 +361,91 @@ class TestPostDelete:
         # Verify post is gone
         response = api_client.get(f'/posts/{post_id}')
         assert response.status_code == 404
+
+
+class TestFeed:
+    """Tests for GET /feed endpoint."""
+    
+    def test_feed_shows_followed_posts(self, api_client, create_test_user, create_test_post):
+        """Test posts of followed users appear in the feed, newest first."""
+        author = create_test_user(email=f'feed_author_{int(time.time()*1000)}@example.com')
+        api_client.post(f'/followers/{author["id"]}')
+        api_client.track_resource('followers', author['id'])
+        first = create_test_post(user_id=author['id'])
+        second = create_test_post(user_id=author['id'], title=f'Second {int(time.time()*1000)}')
+        
+        response = api_client.get('/feed', params={'limit': 1000})
+        assert response.status_code == 200
+        assert response.json()['message'] == 'Posts de las cuentas que sigues'
+        
+        ids = [p['id'] for p in response.json()['results']]
+        assert ids.index(second['id']) < ids.index(first['id'])
+    
+    def test_feed_hides_unfollowed_posts(self, api_client, create_test_user, create_test_post):
+        """Test posts of an unfollowed user leave the feed."""
+        author = create_test_user(email=f'feed_unfollow_{int(time.time()*1000)}@example.com')
+        api_client.post(f'/followers/{author["id"]}')
+        post = create_test_post(user_id=author['id'])
+        api_client.delete(f'/followers/{author["id"]}')
+        
+        response = api_client.get('/feed', params={'limit': 1000})
+        assert post['id'] not in [p['id'] for p in response.json()['results']]
+    
+    def test_feed_follows_date_updates(self, api_client, create_test_user, create_test_post):
+        """Test a post moved back in time by PUT /posts/<id> moves down the feed, listed once."""
+        author = create_test_user(email=f'feed_date_{int(time.time()*1000)}@example.com')
+        api_client.post(f'/followers/{author["id"]}')
+        api_client.track_resource('followers', author['id'])
+        first = create_test_post(user_id=author['id'])
+        second = create_test_post(user_id=author['id'], title=f'Moved {int(time.time()*1000)}')
+        time.sleep(0.5)  # Fan-out runs in the background
+        
+        response = api_client.put(f'/posts/{second["id"]}', json={'date': '2000-01-01T00:00:00'})
+        assert response.status_code == 200
+        
+        ids = [p['id'] for p in api_client.get('/feed', params={'limit': 1000}).json()['results']]
+        assert ids.count(second['id']) == 1
+        assert ids.index(first['id']) < ids.index(second['id'])
+    
+    def test_feed_pagination(self, api_client):
+        """Test GET /feed pages do not overlap."""
+        first_page = api_client.get('/feed', params={'limit': 1}).json()
+        if not first_page['next']:
+            pytest.skip('Not enough posts in the feed')
+        second_page = api_client.get(first_page['next'].replace('/api', '', 1)).json()
+        assert first_page['results'][0]['id'] != second_page['results'][0]['id']
+
+
+class TestPostDetailIncludes:
+    """Tests for GET /posts/<id>?include= endpoint."""
+    
+    def test_post_include_author_media_comments(self, api_client, create_test_user, create_test_post):
+        """Test ?include=author,media,comments embeds the related rows in a bounded number of queries."""
+        user = create_test_user()
+        post = create_test_post(user_id=user['id'])
+        response = api_client.post('/comments', json={
+            'body': f'Included {int(time.time() * 1000)}',
+            'user_id': user['id'],
+            'post_id': post['id']
+        })
+        api_client.track_resource('comments', response.json()['results']['id'])
+        
+        response = api_client.get(f'/posts/{post["id"]}', params={'include': 'author,media,comments'})
+        assert response.status_code == 200
+        
+        result = response.json()['results']
+        assert result['author']['id'] == user['id']
+        assert 'password' not in result['author']
+        assert result['media'] == []
+        assert [c['post_id'] for c in result['comments']] == [post['id']]
+        assert result['comments_next'] is None
+        assert result['comment_count'] == 1
+        if 'X-Query-Count' in response.headers:
+            assert int(response.headers['X-Query-Count']) <= 3
+    
+    def test_post_unknown_include(self, api_client, create_test_user, create_test_post):
+        """Test GET /posts/<id> with an unknown include returns 400."""
+        user = create_test_user()
+        post = create_test_post(user_id=user['id'])
+        response = api_client.get(f'/posts/{post["id"]}', params={'include': 'likes'})
+        assert response.status_code == 400
@@ -0,0 +1,62 @@
+"""
+Tests for the full text search endpoint.
+Covers: GET /search?q=
+"""
+import pytest
+import time
+
+
+class TestSearch:
+    """Tests for GET /search endpoint."""
+    
+    def test_search_finds_character_by_name_prefix(self, api_client, create_test_character):
+        """Test GET /search matches the start of a word in the name."""
+        timestamp = int(time.time() * 1000)
+        character = create_test_character(name=f'Searchable Skywalker {timestamp}')
+        
+        response = api_client.get('/search', params={'q': f'skywal {timestamp}'})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data['message'] == 'Resultados de la búsqueda'
+        found = next((r for r in data['results'] if r['type'] == 'people' and r['uid'] == character['uid']), None)
+        assert found is not None
+        assert found['url'] == f"/api/people/{character['uid']}"
+    
+    def test_search_spans_entities(self, api_client, create_test_planet, create_test_vehicle):
+        """Test GET /search returns planets and vehicles in the same list."""
+        timestamp = int(time.time() * 1000)
+        create_test_planet(name=f'Crosswalk {timestamp}')
+        create_test_vehicle(name=f'Crosswalk Speeder {timestamp}')
+        
+        response = api_client.get('/search', params={'q': f'crosswalk {timestamp}'})
+        types = {r['type'] for r in response.json()['results']}
+        assert {'planets', 'vehicles'} <= types
+    
+    def test_search_follows_updates_and_deletes(self, api_client, create_test_character):
+        """Test renamed and deleted characters leave the index."""
+        timestamp = int(time.time() * 1000)
+        character = create_test_character(name=f'Oldname {timestamp}')
+        api_client.put(f'/people/{character["uid"]}', json={'name': f'Newname {timestamp}'})
+        
+        assert api_client.get('/search', params={'q': f'oldname {timestamp}'}).json()['results'] == []
+        assert len(api_client.get('/search', params={'q': f'newname {timestamp}'}).json()['results']) == 1
+        
+        api_client.delete(f'/people/{character["uid"]}')
+        assert api_client.get('/search', params={'q': f'newname {timestamp}'}).json()['results'] == []
+    
+    def test_search_paginates(self, api_client, create_test_character):
+        """Test GET /search?limit=1 returns a next link."""
+        timestamp = int(time.time() * 1000)
+        create_test_character(name=f'Paged One {timestamp}')
+        create_test_character(name=f'Paged Two {timestamp}')
+        
+        data = api_client.get('/search', params={'q': f'paged {timestamp}', 'limit': 1}).json()
+        assert len(data['results']) == 1
+        assert data['next'] is not None
+    
+    def test_search_empty_query(self, api_client):
+        """Test GET /search without words returns 400."""
+        response = api_client.get('/search', params={'q': '  '})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Query is required'
@@ -3,6 +3,7 @@ Tests for Star Wars entities endpoints (People, Planets, Vehicles).
 Covers CRUD operations for all three entity types.
 """
 import pytest
+import json
 import time
 
 
@@ -155,6 +156,20 @@ class TestPeopleUpdate:
         assert data['results']['height'] == '200'
         assert data['results']['mass'] == '90'
     
+    def test_update_person_ignores_server_fields(self, api_client, create_test_character):
+        """Test PUT /people/<id> can't set favorite_count or the numeric copy of a stat."""
+        character = create_test_character(height='100')
+        
+        response = api_client.put(f'/people/{character["uid"]}',
+                                  json={'favorite_count': 12345, 'height_num': -5, 'mass': '90'})
+        assert response.status_code == 200
+        assert response.json()['results']['mass'] == '90'
+        
+        response = api_client.get('/leaderboard/people', params={'limit': 1000})
+        assert character['uid'] not in [r['uid'] for r in response.json()['results']]
+        response = api_client.get('/people', params={'height_gte': 100, 'height_lte': 100, 'limit': 1000})
+        assert character['uid'] in [c['uid'] for c in response.json()['results']]
+    
     def test_update_person_not_found(self, api_client):
         """Test PUT /people/<id> returns 404 for non-existent character."""
         response = api_client.put('/people/999999', json={'height': '200'})
@@ -468,3 +483,466 @@ class TestVehiclesDelete:
         
         data = response.json()
         assert data['message'] == 'Vehicle not found'
+
+
+class TestCatalogPagination:
+    """Tests for keyset pagination (?after=&limit=) on the catalog list endpoints."""
+    
+    def test_people_limit_and_next_link(self, api_client, create_test_character):
+        """Test GET /people?limit=1 returns one row and a next link."""
+        create_test_character(name=f'Page A {int(time.time() * 1000)}')
+        create_test_character(name=f'Page B {int(time.time() * 1000)}')
+        
+        response = api_client.get('/people', params={'limit': 1})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert len(data['results']) == 1
+        assert data['next'] is not None
+        assert 'after=' in data['next']
+    
+    def test_people_pages_do_not_overlap(self, api_client, create_test_character):
+        """Test following the next link never repeats a row and keeps id order."""
+        create_test_character(name=f'Page C {int(time.time() * 1000)}')
+        create_test_character(name=f'Page D {int(time.time() * 1000)}')
+        
+        first = api_client.get('/people', params={'limit': 1}).json()
+        second = api_client.get(first['next'].replace('/api', '', 1)).json()
+        
+        assert second['results'][0]['uid'] > first['results'][0]['uid']
+    
+    def test_planets_last_page_has_no_next(self, api_client, create_test_planet):
+        """Test GET /planets with a large limit returns next as null."""
+        create_test_planet()
+        
+        data = api_client.get('/planets', params={'limit': 1000}).json()
+        if len(data['results']) < 1000:
+            assert data['next'] is None
+    
+    def test_vehicles_invalid_cursor(self, api_client):
+        """Test GET /vehicles with a malformed cursor returns 400."""
+        response = api_client.get('/vehicles', params={'after': '!!not-a-cursor!!'})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Invalid cursor'
+    
+    def test_people_invalid_limit(self, api_client):
+        """Test GET /people with a non-positive limit returns 400."""
+        response = api_client.get('/people', params={'limit': 0})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Invalid limit'
+
+
+class TestCatalogSparseFields:
+    """Tests for ?fields= on the catalog list endpoints."""
+    
+    def test_people_fields_subset(self, api_client, create_test_character):
+        """Test GET /people?fields=name,gender returns only those fields plus uid and url."""
+        create_test_character()
+        
+        response = api_client.get('/people', params={'fields': 'name,gender'})
+        assert response.status_code == 200
+        
+        for character in response.json()['results']:
+            assert set(character.keys()) == {'uid', 'name', 'gender', 'url'}
+    
+    def test_planets_fields_list_view(self, api_client, create_test_planet):
+        """Test GET /planets?fields=uid,name,url returns the list view payload."""
+        create_test_planet()
+        
+        response = api_client.get('/planets', params={'fields': 'uid,name,url'})
+        assert response.status_code == 200
+        
+        for planet in response.json()['results']:
+            assert set(planet.keys()) == {'uid', 'name', 'url'}
+            assert planet['url'] == f"/api/planets/{planet['uid']}"
+    
+    def test_vehicles_unknown_field(self, api_client):
+        """Test GET /vehicles with an unknown field returns 400."""
+        response = api_client.get('/vehicles', params={'fields': 'name,password'})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Unknown field: password'
+
+
+class TestCatalogRangeFilters:
+    """Tests for ?<stat>_gt= style range filters on the numeric stats."""
+    
+    def test_planets_population_gt(self, api_client, create_test_planet):
+        """Test GET /planets?population_gt= only returns more populated planets."""
+        big = create_test_planet(name=f'Big {int(time.time() * 1000)}', population='2,000,000,000')
+        small = create_test_planet(name=f'Small {int(time.time() * 1000)}', population='1000')
+        
+        response = api_client.get('/planets', params={'population_gt': 1e9, 'limit': 1000})
+        assert response.status_code == 200
+        
+        uids = [p['uid'] for p in response.json()['results']]
+        assert big['uid'] in uids
+        assert small['uid'] not in uids
+    
+    def test_people_unknown_stat_is_excluded(self, api_client, create_test_character):
+        """Test characters with an "unknown" mass never match a mass range."""
+        character = create_test_character(mass='unknown')
+        
+        response = api_client.get('/people', params={'mass_gte': 0, 'limit': 1000})
+        uids = [c['uid'] for c in response.json()['results']]
+        assert character['uid'] not in uids
+    
+    def test_people_range_follows_updates(self, api_client, create_test_character):
+        """Test PUT /people/<id> keeps the numeric copy of the stat in sync."""
+        character = create_test_character(height='100')
+        api_client.put(f'/people/{character["uid"]}', json={'height': '250'})
+        
+        response = api_client.get('/people', params={'height_gt': 200, 'limit': 1000})
+        uids = [c['uid'] for c in response.json()['results']]
+        assert character['uid'] in uids
+    
+    def test_vehicles_filter_on_text_column(self, api_client):
+        """Test a range filter on a non numeric column returns 400."""
+        response = api_client.get('/vehicles', params={'model_gt': 1})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Unknown filter: model_gt'
+
+
+class TestCatalogFilterSort:
+    """Tests for ?filter[<field>]= and ?sort= on the catalog list endpoints."""
+    
+    def test_people_filter_by_gender(self, api_client, create_test_character):
+        """Test GET /people?filter[gender]= only returns matching characters."""
+        create_test_character(gender='female')
+        create_test_character(name=f'Other {int(time.time() * 1000)}', gender='male')
+        
+        response = api_client.get('/people', params={'filter[gender]': 'female', 'limit': 1000})
+        assert response.status_code == 200
+        
+        results = response.json()['results']
+        assert len(results) >= 1
+        assert all(c['gender'] == 'female' for c in results)
+    
+    def test_people_sort_by_mass_desc(self, api_client, create_test_character):
+        """Test GET /people?sort=-mass sorts by the numeric mass, unknown last."""
+        create_test_character(name=f'Heavy {int(time.time() * 1000)}', mass='1,358')
+        create_test_character(name=f'Light {int(time.time() * 1000)}', mass='17')
+        
+        response = api_client.get('/people', params={'sort': '-mass', 'fields': 'mass', 'limit': 1000})
+        assert response.status_code == 200
+        
+        masses = [float(c['mass'].replace(',', '')) for c in response.json()['results']
+                  if c['mass'] not in (None, 'unknown', 'n/a')]
+        assert masses == sorted(masses, reverse=True)
+    
+    def test_planets_sorted_pages_do_not_overlap(self, api_client, create_test_planet):
+        """Test following next links with a sort returns every row once."""
+        for population in ('10', '20', '30'):
+            create_test_planet(name=f'Sorted {population} {int(time.time() * 1000)}', population=population)
+        
+        seen = []
+        data = api_client.get('/planets', params={'sort': 'population', 'limit': 2}).json()
+        seen.extend(p['uid'] for p in data['results'])
+        while data['next']:
+            data = api_client.get(data['next'].replace('/api', '', 1)).json()
+            seen.extend(p['uid'] for p in data['results'])
+        assert len(seen) == len(set(seen))
+    
+    def test_vehicles_unknown_filter(self, api_client):
+        """Test filtering on a column outside the whitelist returns 400."""
+        response = api_client.get('/vehicles', params={'filter[consumables]': '1 year'})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Unknown filter: filter[consumables]'
+    
+    def test_vehicles_unknown_sort(self, api_client):
+        """Test sorting on a column outside the whitelist returns 400."""
+        response = api_client.get('/vehicles', params={'sort': '-consumables'})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Unknown sort field: consumables'
+
+
+class TestCatalogDetailCache:
+    """Tests for the cached detail lookups of people, planets and vehicles."""
+    
+    def test_repeated_get_is_a_cache_hit(self, api_client, create_test_character):
+        """Test a second GET /people/<id> is counted as a cache hit."""
+        character = create_test_character()
+        api_client.get(f'/people/{character["uid"]}')
+        hits = api_client.get('/cache/stats').json()['results']['detail']['hits']
+        
+        response = api_client.get(f'/people/{character["uid"]}')
+        assert response.status_code == 200
+        assert response.json()['results']['uid'] == character['uid']
+        
+        stats = api_client.get('/cache/stats').json()['results']['detail']
+        assert stats['hits'] == hits + 1
+    
+    def test_update_invalidates_cached_planet(self, api_client, create_test_planet):
+        """Test GET /planets/<id> after a PUT returns the new values."""
+        planet = create_test_planet()
+        api_client.get(f'/planets/{planet["uid"]}')
+        
+        api_client.put(f'/planets/{planet["uid"]}', json={'climate': 'frozen'})
+        
+        response = api_client.get(f'/planets/{planet["uid"]}')
+        assert response.json()['results']['climate'] == 'frozen'
+    
+    def test_delete_invalidates_cached_vehicle(self, api_client):
+        """Test GET /vehicles/<id> after a DELETE returns 404."""
+        timestamp = int(time.time() * 1000)
+        vehicle_data = {
+            'name': f'Cached {timestamp}',
+            'model': 'Test Model',
+            'manufacturer': 'Test Manufacturer',
+            'vehicle_class': 'Test Class'
+        }
+        vehicle_id = api_client.post('/vehicles', json=vehicle_data).json()['results']['id']
+        api_client.get(f'/vehicles/{vehicle_id}')
+        
+        api_client.delete(f'/vehicles/{vehicle_id}')
+        
+        response = api_client.get(f'/vehicles/{vehicle_id}')
+        assert response.status_code == 404
+    
+    def test_cache_stats_structure(self, api_client):
+        """Test GET /cache/stats returns the counters used to size the cache."""
+        response = api_client.get('/cache/stats')
+        assert response.status_code == 200
+        
+        stats = response.json()['results']['detail']
+        assert {'size', 'maxsize', 'ttl', 'hits', 'misses', 'evictions'} <= set(stats.keys())
+
+
+class TestCatalogConditionalGet:
+    """Tests for ETag / If-None-Match on the catalog endpoints."""
+    
+    def test_people_list_not_modified(self, api_client, create_test_character):
+        """Test GET /people with a matching If-None-Match returns 304."""
+        create_test_character()
+        
+        response = api_client.get('/people')
+        etag = response.headers['ETag']
+        
+        response = api_client.get('/people', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+    
+    def test_people_list_etag_changes_after_create(self, api_client, create_test_character):
+        """Test POST /people changes the ETag of the list."""
+        etag = api_client.get('/people').headers['ETag']
+        
+        create_test_character()
+        
+        response = api_client.get('/people', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    
+    def test_planet_detail_etag_changes_after_update(self, api_client, create_test_planet):
+        """Test PUT /planets/<id> changes the ETag of the planet."""
+        planet = create_test_planet()
+        etag = api_client.get(f'/planets/{planet["uid"]}').headers['ETag']
+        assert api_client.get(f'/planets/{planet["uid"]}', headers={'If-None-Match': etag}).status_code == 304
+        
+        api_client.put(f'/planets/{planet["uid"]}', json={'terrain': 'ocean'})
+        
+        response = api_client.get(f'/planets/{planet["uid"]}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.json()['results']['terrain'] == 'ocean'
+    
+    def test_vehicles_etag_depends_on_query(self, api_client):
+        """Test two different pages of /vehicles have different ETags."""
+        first = api_client.get('/vehicles', params={'limit': 1}).headers['ETag']
+        second = api_client.get('/vehicles', params={'limit': 2}).headers['ETag']
+        assert first != second
+
+
+class TestCatalogListBodyCache:
+    """Tests for the cached, precompressed catalog list bodies."""
+    
+    def test_repeated_list_is_served_from_cache(self, api_client, create_test_planet):
+        """Test a second GET /planets returns the same body and counts a cache hit."""
+        create_test_planet()
+        first = api_client.get('/planets')
+        hits = api_client.get('/cache/stats').json()['results']['lists']['hits']
+        
+        second = api_client.get('/planets')
+        assert second.json() == first.json()
+        assert api_client.get('/cache/stats').json()['results']['lists']['hits'] == hits + 1
+    
+    def test_list_gzip_variant(self, api_client, create_test_character):
+        """Test GET /people with Accept-Encoding: gzip returns a gzip body with its own ETag."""
+        create_test_character()
+        plain = api_client.get('/people', headers={'Accept-Encoding': 'identity'})
+        
+        response = api_client.get('/people', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.headers['ETag'] != plain.headers['ETag']
+        assert response.json() == plain.json()
+    
+    def test_list_cache_follows_writes(self, api_client, create_test_vehicle):
+        """Test a new vehicle shows up even after the list was cached."""
+        api_client.get('/vehicles', params={'limit': 1000})
+        vehicle = create_test_vehicle()
+        
+        response = api_client.get('/vehicles', params={'limit': 1000})
+        assert vehicle['id'] in [v['id'] for v in response.json()['results']]
+
+
+class TestCatalogBatchCreate:
+    """Tests for POST /people/batch, /planets/batch and /vehicles/batch."""
+    
+    def test_people_batch_success(self, api_client):
+        """Test POST /people/batch creates every item and keeps their order."""
+        timestamp = int(time.time() * 1000)
+        items = [{'name': f'Batch {i} {timestamp}', 'mass': str(50 + i)} for i in range(3)]
+        
+        response = api_client.post('/people/batch', json=items)
+        assert response.status_code == 201
+        
+        data = response.json()
+        assert data['message'] == 'Personajes creados'
+        assert [r['name'] for r in data['results']] == [item['name'] for item in items]
+        assert [r['index'] for r in data['results']] == [0, 1, 2]
+        for result in data['results']:
+            api_client.track_resource('characters', result['uid'])
+            assert result['url'] == f"/api/people/{result['uid']}"
+    
+    def test_people_batch_is_all_or_nothing(self, api_client, create_test_character):
+        """Test one invalid item rejects the whole batch with per item errors."""
+        character = create_test_character()
+        timestamp = int(time.time() * 1000)
+        items = [{'name': f'Valid {timestamp}'}, {'name': character['name']}, {'mass': '80'}]
+        
+        response = api_client.post('/people/batch', json=items)
+        assert response.status_code == 400
+        
+        data = response.json()
+        assert data['message'] == 'Invalid items'
+        assert [r['index'] for r in data['results']] == [1, 2]
+        
+        names = [c['name'] for c in api_client.get('/people', params={'filter[name]': f'Valid {timestamp}'}).json()['results']]
+        assert names == []
+    
+    def test_people_batch_rejects_non_string_values(self, api_client):
+        """Test POST /people/batch reports the fields that are not strings."""
+        timestamp = int(time.time() * 1000)
+        response = api_client.post('/people/batch', json=[{'name': f'Typed {timestamp}', 'mass': 80,
+                                                           'gender': ['male']}])
+        assert response.status_code == 400
+        errors = response.json()['results'][0]['errors']
+        assert 'mass must be a string' in errors
+        assert 'gender must be a string' in errors
+    
+    def test_planets_batch_missing_fields(self, api_client):
+        """Test POST /planets/batch reports the missing required fields."""
+        response = api_client.post('/planets/batch', json=[{'name': 'Half a planet'}])
+        assert response.status_code == 400
+        assert 'climate is required' in response.json()['results'][0]['errors']
+    
+    def test_vehicles_batch_success(self, api_client):
+        """Test POST /vehicles/batch creates vehicles."""
+        timestamp = int(time.time() * 1000)
+        items = [{'name': f'Batch Speeder {i} {timestamp}', 'model': 'Test Model',
+                  'manufacturer': 'Test Manufacturer', 'vehicle_class': 'Test Class'} for i in range(2)]
+        
+        response = api_client.post('/vehicles/batch', json=items)
+        assert response.status_code == 201
+        for result in response.json()['results']:
+            api_client.track_resource('vehicles', result['id'])
+    
+    def test_batch_requires_a_list(self, api_client):
+        """Test POST /vehicles/batch with an object returns 400."""
+        response = api_client.post('/vehicles/batch', json={'name': 'Not a list'})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'A non empty list of items is required'
+
+
+class TestCatalogMultiGet:
+    """Tests for GET /people?ids=, /planets?ids= and /vehicles?ids=."""
+    
+    def test_people_ids_keep_request_order(self, api_client, create_test_character):
+        """Test ?ids= returns the rows in the requested order and lists missing ids."""
+        first = create_test_character()
+        second = create_test_character()
+        
+        response = api_client.get('/people', params={'ids': f"{second['uid']},999999,{first['uid']}"})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert [r['uid'] for r in data['results']] == [second['uid'], first['uid']]
+        assert data['missing'] == [999999]
+    
+    def test_planets_ids_with_fields(self, api_client, create_test_planet):
+        """Test ?ids= can be combined with ?fields=."""
+        planet = create_test_planet()
+        
+        response = api_client.get('/planets', params={'ids': str(planet['uid']), 'fields': 'name'})
+        assert response.status_code == 200
+        assert response.json()['results'] == [{'name': planet['name'], 'uid': planet['uid'], 'url': f"/api/planets/{planet['uid']}"}]
+    
+    def test_vehicles_invalid_ids(self, api_client):
+        """Test GET /vehicles rejects ids that are not numbers."""
+        response = api_client.get('/vehicles', params={'ids': '1,abc'})
+        assert response.status_code == 400
+        assert response.json()['message'] == 'Invalid id: abc'
+
+
+class TestCatalogFacets:
+    """Tests for GET /facets/<entity>."""
+    
+    def facet_count(self, api_client, entity, field, value):
+        response = api_client.get(f'/facets/{entity}')
+        assert response.status_code == 200
+        counts = {r['value']: r['count'] for r in response.json()['results'][field]}
+        return counts.get(value, 0)
+    
+    def test_people_facets_follow_writes(self, api_client, create_test_character):
+        """Test the gender counts follow POST, PUT and DELETE."""
+        gender = f'Gender {int(time.time() * 1000)}'
+        character = create_test_character(gender=gender)
+        assert self.facet_count(api_client, 'people', 'gender', gender) == 1
+        
+        api_client.put(f"/people/{character['uid']}", json={'gender': f'{gender} b'})
+        assert self.facet_count(api_client, 'people', 'gender', gender) == 0
+        assert self.facet_count(api_client, 'people', 'gender', f'{gender} b') == 1
+        
+        api_client.delete(f"/people/{character['uid']}")
+        assert self.facet_count(api_client, 'people', 'gender', f'{gender} b') == 0
+    
+    def test_planets_facets_fields(self, api_client):
+        """Test GET /facets/planets returns the climate and terrain facets."""
+        response = api_client.get('/facets/planets')
+        assert response.status_code == 200
+        assert set(response.json()['results']) == {'climate', 'terrain'}
+    
+    def test_unknown_entity_facets(self, api_client):
+        """Test GET /facets of an unknown entity returns 404."""
+        response = api_client.get('/facets/starships')
+        assert response.status_code == 404
+
+
+class TestExportNdjson:
+    """Tests for GET /export/<table>.ndjson."""
+    
+    def test_export_people_resumes_after_id(self, api_client, create_test_character):
+        """Test ?after_id= only streams the rows after that id."""
+        first = create_test_character()
+        second = create_test_character()
+        
+        response = api_client.get('/export/people.ndjson', params={'after_id': first['uid']})
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('application/x-ndjson')
+        
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        uids = [row['uid'] for row in rows]
+        assert first['uid'] not in uids
+        assert second['uid'] in uids
+        assert uids == sorted(uids)
+    
+    def test_export_users_hides_passwords(self, api_client, create_test_user):
+        """Test the users dump never includes passwords."""
+        create_test_user()
+        response = api_client.get('/export/users.ndjson')
+        assert response.status_code == 200
+        assert all('password' not in json.loads(line) for line in response.text.splitlines())
+    
+    def test_export_unknown_table(self, api_client):
+        """Test GET /export of an unknown table returns 404."""
+        response = api_client.get('/export/secrets.ndjson')
+        assert response.status_code == 404